@@ -0,0 +1,44 @@
+"""
+Fast job to count records broken down by a subset of the MR dims.
+
+The payload body is never parsed, so this is almost as cheap as 
+count_records.py. Output keys are cached per combination of dim values, and 
+counts are aggregated within each mapper by the combiner. The dims to group 
+by are given as a comma-separated list of names from 
+utils.payload_utils.dims_keys in the environment variable FXOS_COUNT_DIMS 
+(eg. "submission_date,appUpdateChannel"). The default is to count by 
+submission date.
+
+Output records are of the form ('datum', <dim value>, ...): count, with dim 
+values in the order they were listed.
+"""
+
+import os
+
+import utils.mapred as mapred
+from utils.payload_utils import dims_keys
+
+# Dims to group counts by.
+count_dims = os.environ.get('FXOS_COUNT_DIMS', 'submission_date').split(',')
+dims_indices = [dims_keys.index(d.strip()) for d in count_dims]
+
+# Cache of output keys by dim values, so that identical key tuples are reused
+# rather than rebuilt for every record.
+output_keys = {}
+
+
+def map(key, dims, value, context):
+    """Count records by emitting 1 for each combination of dim values."""
+    if len(dims) != len(dims_keys):
+        mapred.write_condition_tuple(context, 'bad dims length')
+        return
+    dimvals = tuple([dims[i] for i in dims_indices])
+    k = output_keys.get(dimvals)
+    if k is None:
+        k = mapred.prepare_datum_key(list(dimvals))
+        output_keys[dimvals] = k
+    context.write(k, 1)
+
+# Summing reducer with combiner. 
+reduce = mapred.summing_reducer
+combine = reduce
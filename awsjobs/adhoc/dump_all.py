@@ -5,8 +5,17 @@ No reducer is necessary.
 """
 
 import utils.payload_utils as payload
+import utils.date_window as window
+
+# Earliest submission and ping dates to dump.
+earliest_submission, earliest_ping = window.get_window_dates('au')
 
 def map(key, dims, value, context):
     """Emit raw JSON records, appending server-side submission date.""" 
+    if not payload.in_date_window(context, value, dims, earliest_submission,
+                                                    earliest_ping, 'stop'):
+        return
+    if not payload.sample_payload(context, value, 'deviceID'):
+        return
     value = payload.insert_submission_date(value, dims)
     context.write(key, value)
@@ -1,30 +1,84 @@
 """
 Find the list of keys that occur across the JSON payloads, counting occurrences.
+
+Most payloads share one of a small number of structures. Rather than emitting
+every keypath for every payload, the mapper computes a cheap structural 
+signature for each payload, and caches the keypaths and their value types 
+for each signature. Payloads are then counted by signature, and the keypaths 
+for each signature are emitted only once per mapper process (unless the 
+cache of signatures fills up and is cleared).
+
+Output records are of the form:
+- ('datum', 'signature', <signature ID>): number of payloads with that 
+  structure
+- ('datum', 'keypath', <signature ID>, <keypath>, <value type>): emitted once 
+  per mapper for each keypath in the structure. The count is not meaningful.
+
+Keypath counts and value type histograms are obtained by joining these on
+the signature ID (see postprocessing/keypath_summary.py).
 """
 
 import json
+import hashlib
 import utils.mapred as mapred
 import utils.payload_utils as payload
 
+# Subtrees whose keys vary by payload, and should not be searched.
+exclude_paths = (['info','apps'], ['info','searches'],)
+
+# Cache mapping structural signatures to signature IDs, populated as 
+# new structures are encountered by this mapper.
+signature_ids = {}
+# Maximum number of signatures to cache. Payloads normally share a handful of
+# structures, but malformed payloads can each have their own. When the cache 
+# is full it is cleared, and the keypaths for signatures seen again are 
+# re-emitted, which is harmless since they are collected as a set.
+max_cached_signatures = 10000
+
+
+def signature_id(keypath_types):
+    """Generate a stable identifier for a payload structure from its list of
+    (keypath, value type) pairs.
+    
+    This is independent of the ordering of the keys, so that payloads with 
+    the same structure get the same ID across mappers.
+    """
+    desc = '\n'.join(sorted(['%s\t%s' % kt for kt in keypath_types]))
+    return hashlib.md5(desc.encode('utf-8')).hexdigest()[:16]
+
 
 def map(key, dims, value, context):
-    """Parse the JSON, and traverse each dict level, emitting key names.
+    """Parse the JSON, and count payloads by structural signature. 
+    
+    The keypaths and value types for each newly encountered signature are 
+    emitted the first time it is seen.
     """
     mapred.increment_counter_tuple(context, 'nrecords')
+    # Sample by device, if required, before parsing.
+    if not payload.sample_payload(context, value, 'deviceID'):
+        return
     
     try:
         r = json.loads(value)
-        keys = payload.get_keypaths(r, (['info','apps'], ['info','searches'],))
-        skeys = set(keys)
-        if len(skeys) != len(keys):
-            mapred.write_condition_tuple(context, 'nonunique')
-        for k in skeys:
-            context.write(('datum', k), 1)
+        signature = payload.get_structure_signature(r, exclude_paths)
+        sig_id = signature_ids.get(signature)
+        if sig_id is None:
+            # New structure - traverse the payload in full.
+            flattened = payload.walk_nested_dict(r, exclude_paths)
+            keypath_types = [(k, type(v).__name__) for k, v in flattened]
+            if len(set(k for k, t in keypath_types)) != len(keypath_types):
+                mapred.write_condition_tuple(context, 'nonunique')
+            sig_id = signature_id(keypath_types)
+            if len(signature_ids) >= max_cached_signatures:
+                signature_ids.clear()
+            signature_ids[signature] = sig_id
+            mapred.increment_counter_tuple(context, 'nsignatures')
+            for k, t in keypath_types:
+                mapred.write_datum_tuple(context, ['keypath', sig_id, k, t])
+        mapred.write_datum_tuple(context, ['signature', sig_id])
     except Exception as e:
         mapred.write_condition_tuple(context, type(e).__name__ + ' ' + str(e))
 
 # Summing reducer with combiner. 
 reduce = mapred.summing_reducer
 combine = reduce
-
-            
\ No newline at end of file
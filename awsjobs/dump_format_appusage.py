@@ -12,13 +12,62 @@ indicating how many records were found belonging to the segment.
 """
 
 import json
+import os
+import os.path
 from datetime import datetime
+from collections import defaultdict
 import re
 
 import utils.ftu_formatter as fmt
 import utils.mapred as mapred
 import utils.dump_schema as schema
 import utils.payload_utils as payload
+import utils.date_window as window
+import utils.bloom as bloom
+
+# Earliest submission and ping dates to process.
+# The ping date for AU payloads is the end of the recording period.
+earliest_submission, earliest_ping = window.get_window_dates('au')
+
+# Bloom filter of payload identifiers seen in previous runs, written by 
+# postprocessing/au_incremental.py and downloaded by dump_appusage.sh at the 
+# start of the run. The path is set using the environment variable 
+# FXOS_AU_SEEN_FILTER (see AU_SEEN_FILTER in settings.env). Loaded when first 
+# needed, if present.
+seen_filter_file = os.environ.get('FXOS_AU_SEEN_FILTER')
+seen_filter = {}
+
+# Key the payload rows by a 64-bit hash of the payload identifier rather than 
+# the identifier itself, carrying the identifier only on the info row. This 
+# reduces the amount of data shuffled for the app and search rows.
+# Set using the environment variable FXOS_AU_COMPACT_KEYS.
+compact_keys = os.environ.get('FXOS_AU_COMPACT_KEYS') == 'true'
+
+
+def get_seen_filter():
+    """Load the filter of previously seen payloads, or None if missing."""
+    if 'filter' not in seen_filter:
+        seen_filter['filter'] = (bloom.load(seen_filter_file) 
+            if seen_filter_file and os.path.exists(seen_filter_file) 
+            else None)
+    return seen_filter['filter']
+
+
+def count_dated_entries(data):
+    """Count the rows that would be output for a dict of app or search data, 
+    keyed by app URL or search provider and then by yyyymmdd date. 
+    
+    Entries with bad dates are skipped, as when the rows are formatted.
+    """
+    n = 0
+    for k in data:
+        for date in data[k]:
+            try:
+                datetime.strptime(date, '%Y%m%d')
+            except ValueError:
+                continue
+            n += 1
+    return n
 
 
 def consistent_au(r):
@@ -49,6 +98,13 @@ def map(key, dims, value, context):
     to the reducer for counting.
     """    
     mapred.increment_counter_tuple(context, 'nrecords')
+    # Skip records outside the date window.
+    if not payload.in_date_window(context, value, dims, earliest_submission,
+                                                    earliest_ping, 'stop'):
+        return
+    # Sample by device, if required, before parsing.
+    if not payload.sample_payload(context, value, 'deviceID'):
+        return
     try:
         r = json.loads(value)
         # Check basic consistency. 
@@ -67,6 +123,20 @@ def map(key, dims, value, context):
                 mapred.write_condition_tuple(context, 'missing' + k)
                 return
         
+        # Check whether the payload was seen in a previous run.
+        # If so, the app and search rows can be skipped. 
+        seen = get_seen_filter()
+        seen = seen is not None and bloom.contains(seen, 
+            payload.payload_id_string([r[k] for k in 
+                schema.au_ping_identifier_keys]))
+        if seen:
+            # Drop the app and search data before it gets formatted, 
+            # keeping note of the number of rows of each, so that they can 
+            # be checked against the rows already stored for the payload. 
+            mapred.increment_counter_tuple(context, 'seenpayloads')
+            num_skipped = [count_dated_entries(r.pop('apps', {})),
+                count_dated_entries(r.pop('searches', {}))]
+        
         #-----
         
         # Rearrange.
@@ -235,10 +305,10 @@ def map(key, dims, value, context):
                         # so that it gets recorded as missing.
                         del appstats['activities']
                     else:
-                        # Stringify the activities dict.
-                        activities = ';'.join(
-                            ['%s:%s' % (k,v) for k, v in appstats['activities'].items()])
-                        appstats['activities'] = activities
+                        # Record the activities dict as a tuple of 
+                        # (activity, count) pairs, sorted by activity.
+                        appstats['activities'] = tuple(sorted(
+                            appstats['activities'].iteritems()))
                 # Add URL and date to record.
                 appstats['appurl'] = appurl
                 appstats['date'] = isodate
@@ -268,14 +338,25 @@ def map(key, dims, value, context):
         
         payload_id = mapred.dict_to_ordered_list(r, 
             schema.au_ping_identifier_keys)
-        payload_key = mapred.prepare_datum_key(payload_id)
+        if compact_keys:
+            # Key by the hash, and prepend the identifier to the info row.
+            payload_key = mapred.prepare_datum_key(
+                [payload.payload_hash(payload_id)])
+            info_row = list(payload_id)
+        else:
+            payload_key = mapred.prepare_datum_key(payload_id)
+            info_row = []
         # Add flag for dogfooding devices.
         #payload_id.append(is_dogfood_device(r))        
         
         # Output one row per payload with top-level info.
-        info_row = mapred.dict_to_ordered_list(r, schema.au_device_info_keys)
+        info_row += mapred.dict_to_ordered_list(r, schema.au_device_info_keys)
         info_row.append('info')
         context.write(payload_key, info_row)
+        if seen:
+            # Output a marker with the numbers of skipped app and search 
+            # entries in place of the rows.
+            context.write(payload_key, num_skipped + ['seen'])
         # Output each app and search row separately.
         for app_row in appdata:
             app_row = mapred.dict_to_ordered_list(app_row, 
@@ -368,66 +449,110 @@ def reduce(key, values, context):
     exist for each payload ID. Count duplicates, and output unique record.
     
     Outputted records follow the general format in utils.mapred.
-    A tag ('info', 'app', 'search') will be found at the end of each data
-    row outputted as a MR value.
+    A tag ('info', 'app', 'search', or 'seen' for the marker replacing app
+    and search rows for previously seen payloads) will be found at the end of 
+    each data row outputted as a MR value.
     The info rows will have an additional penultimate count giving the total
     number of records for that payload.
     
+    If the rows are keyed by payload hash (see compact_keys), the payload 
+    identifier is first restored from the info rows (see reduce_compact()).
+    
     For non-data records (eg. counters), default to the summing reducer.
     """
-    if key[0] == 'datum':
-        # Separate info records from others.
-        rows = {'info': [], 'other': []}
-        for v in values:
-            if v[-1] == 'info':
-                rows['info'].append(tuple(v))
-            else:
-                rows['other'].append(tuple(v))
-        raw_counts = {}
-        for k in rows:
-            raw_counts[k] = len(rows[k])
-            # Deduplicate.
-            rows[k] = set(rows[k])
-        # Extract the single info row for this payload.
-        # If there are multiple unique info rows, check whether 
-        # the difference is caused by the submission date (element 0).
-        if len(rows['info']) > 1:
-            without_submission_date = []
-            for r in rows['info']:
-                without_submission_date.append(r[1:])
-            without_submission_date = set(without_submission_date)
-            if len(without_submission_date) == 1:
-                # The only difference was submission date.
-                # Retain the info record with earliest submission date.
-                info_rows = list(rows['info'])
-                submission_dates = [r[0] for r in info_rows]
-                final_index = submission_dates.index(min(submission_dates))
-                info_row = info_rows[final_index]
-            else:
-                # We have multiple unique info rows.
-                # Error condition.
-                # Output multiple info rows with tag.
-                # Skip app/search data.
-                key = list(key)
-                key[1] = 'multiple:%s' % key[1]
-                key = tuple(key)
-                for r in rows['info']:
-                    context.write(key, r)
-                return
-        else:
-            info_row = rows['info'].pop()
-        # Append total number of records for this payload ID:
-        info_row = list(info_row)
-        info_row.insert(len(info_row) - 1, raw_counts['info'])
-        # Output unique rows.
-        context.write(key, info_row)
-        for r in rows['other']:
-            context.write(key, r)
+    if key[0] == 'datum' and len(key) == 2:
+        reduce_compact(key, values, context)
+    elif key[0] == 'datum':
+        reduce_payload(key, values, context)
     else:
         # Otherwise use summing reducer.
         mapred.summing_reducer(key, values, context)
 
 
+def reduce_compact(key, values, context):
+    """Restore the payload identifier for rows keyed by payload hash, and 
+    deduplicate as in reduce_payload().
+    
+    The info rows carry the full identifier at the start. If they contain 
+    more than one identifier, the hash collided. The collision is reported as
+    a condition listing the identifiers, and the info rows for each payload 
+    are output as usual, but the app and search rows are dropped since they 
+    cannot be attributed to a payload.
+    """
+    id_length = len(schema.au_ping_identifier_keys)
+    info_rows = defaultdict(list)
+    other_rows = []
+    for v in values:
+        if v[-1] == 'info':
+            info_rows[tuple(v[:id_length])].append(v[id_length:])
+        else:
+            other_rows.append(v)
+    if not info_rows:
+        context.write(('condition', 
+            'no info rows for payload key %s' % key[1]), 1)
+        return
+    if len(info_rows) > 1:
+        context.write(('condition', 'payload key collision: %s' % 
+            ', '.join([payload.payload_id_string(payload_id) 
+                for payload_id in sorted(info_rows)])), 1)
+        for payload_id, rows in info_rows.iteritems():
+            reduce_payload(('datum',) + payload_id, rows, context)
+        return
+    payload_id, rows = info_rows.items()[0]
+    reduce_payload(('datum',) + payload_id, rows + other_rows, context)
+
+
+def reduce_payload(key, values, context):
+    """Deduplicate the data records for a payload, keyed by its identifier."""
+    # Separate info records from others.
+    rows = {'info': [], 'other': []}
+    for v in values:
+        if v[-1] == 'info':
+            rows['info'].append(tuple(v))
+        else:
+            rows['other'].append(tuple(v))
+    raw_counts = {}
+    for k in rows:
+        raw_counts[k] = len(rows[k])
+        # Deduplicate.
+        rows[k] = set(rows[k])
+    # Extract the single info row for this payload.
+    # If there are multiple unique info rows, check whether 
+    # the difference is caused by the submission date (element 0).
+    if len(rows['info']) > 1:
+        without_submission_date = []
+        for r in rows['info']:
+            without_submission_date.append(r[1:])
+        without_submission_date = set(without_submission_date)
+        if len(without_submission_date) == 1:
+            # The only difference was submission date.
+            # Retain the info record with earliest submission date.
+            info_rows = list(rows['info'])
+            submission_dates = [r[0] for r in info_rows]
+            final_index = submission_dates.index(min(submission_dates))
+            info_row = info_rows[final_index]
+        else:
+            # We have multiple unique info rows.
+            # Error condition.
+            # Output multiple info rows with tag.
+            # Skip app/search data.
+            key = list(key)
+            key[1] = 'multiple:%s' % key[1]
+            key = tuple(key)
+            for r in rows['info']:
+                context.write(key, r)
+            return
+    else:
+        info_row = rows['info'].pop()
+    # Append total number of records for this payload ID:
+    info_row = list(info_row)
+    info_row.insert(len(info_row) - 1, raw_counts['info'])
+    # Output unique rows.
+    context.write(key, info_row)
+    for r in rows['other']:
+        context.write(key, r)
+
+
 
 # Summing reducer with combiner. 
 # reduce = mapred.summing_reducer
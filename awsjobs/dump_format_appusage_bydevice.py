@@ -0,0 +1,119 @@
+"""
+Variant of the AU job (dump_format_appusage.py) which reduces by device, so
+that the per-device processing is done on the cluster.
+
+The mapper is the same as in the AU job, except that rows are keyed by
+deviceID alone, and the payload start and stop times are carried at the
+start of each value. The reducer groups the values for a device by
+(start, stop), and deduplicates the rows for each payload in order as in the
+AU job reducer. It then classifies the device's pings for overlap and, for
+foxfood devices, generates the foxfood summaries.
+
+The output contains the same info, app and search rows as the AU job, keyed
+by ('datum', deviceID, start, stop). Device-level rows are keyed by
+('datum', deviceID), with the following tags at the end of the value:
+- 'conditions': the dogfooding flag, the number of info rows with an
+  inconsistent dogfooding flag, and counts of pings for each condition in
+  utils.device_timeline.ping_conditions. Only output if any are non-zero.
+- 'dogfood_details': a row of the dogfood details table, without deviceID
+- 'dogfood_history': a row of the dogfood history table, without deviceID
+- 'dogfood_appusage': a row of the dogfood app usage table, without deviceID.
+The output is converted to CSVs using postprocessing/au_device_tables.py.
+"""
+
+from collections import defaultdict
+
+import utils.mapred as mapred
+from utils.device_timeline import ping_conditions
+from utils.dogfood_summary import (summarize_device, dogfood_details_row,
+    dogfood_history_rows, dogfood_appusage_rows)
+import dump_format_appusage as appusage
+
+# Rows are already keyed by device, which groups them more coarsely than a
+# payload hash would, so compact payload keys are not used.
+appusage.compact_keys = False
+
+
+class DeviceKeyContext(object):
+    """Wrapper for the MR context which rekeys payload rows by device.
+    
+    Rows written with key ('datum', deviceID, start, stop) are written with
+    key ('datum', deviceID), and start and stop prepended to the value.
+    Other records are written unchanged.
+    """
+    
+    def __init__(self, context):
+        self.context = context
+    
+    def write(self, key, value):
+        if key[0] == 'datum':
+            self.context.write(key[:2], list(key[2:]) + list(value))
+        else:
+            self.context.write(key, value)
+
+
+class ListContext(object):
+    """MR context which collects records in a list."""
+    
+    def __init__(self):
+        self.records = []
+    
+    def write(self, key, value):
+        self.records.append((key, value))
+
+
+def map(key, dims, value, context):
+    """Parse and format the payload as in the AU job, keying rows by device."""
+    appusage.map(key, dims, value, DeviceKeyContext(context))
+
+
+def reduce(key, values, context):
+    """Deduplicate payloads for a device, and summarize the device.
+    
+    For non-data records (eg. counters), default to the summing reducer.
+    """
+    if key[0] != 'datum':
+        mapred.summing_reducer(key, values, context)
+        return
+    device_id = key[1]
+    # Group rows by payload, identified by (start, stop).
+    payloads = defaultdict(list)
+    for v in values:
+        payloads[tuple(v[:2])].append(v[2:])
+    
+    # Deduplicate each payload using the AU job reducer, in order of
+    # (start, stop), and collect the full info and app rows.
+    info_rows = []
+    app_rows = []
+    for payload_id in sorted(payloads):
+        payload_key = ('datum', device_id) + payload_id
+        output = ListContext()
+        appusage.reduce(payload_key, payloads[payload_id], output)
+        for k, v in output.records:
+            context.write(k, v)
+            if k != payload_key:
+                # Payload had multiple unique info rows.
+                continue
+            # Full table rows start with the payload identifier.
+            if v[-1] == 'info':
+                # Drop the record count and tag.
+                info_rows.append(list(payload_key[1:]) + list(v[:-2]))
+            elif v[-1] == 'app':
+                app_rows.append(list(payload_key[1:]) + list(v[:-1]))
+    if not info_rows:
+        return
+    
+    counts, is_dogfood, inconsistent, summary = summarize_device(device_id,
+        info_rows, app_rows)
+    if counts or inconsistent:
+        context.write(key, [is_dogfood, inconsistent] +
+            [counts.get(c, 0) for c in ping_conditions] + ['conditions'])
+    if summary is None:
+        return
+    details, app_usage = summary
+    context.write(key, dogfood_details_row(device_id,
+        details[device_id])[1:] + ['dogfood_details'])
+    for row in dogfood_history_rows(device_id, details[device_id]):
+        context.write(key, row[1:] + ['dogfood_history'])
+    for row in dogfood_appusage_rows(device_id, app_usage.get(device_id, {})):
+        context.write(key, row[1:] + ['dogfood_appusage'])
@@ -17,6 +17,11 @@ from datetime import datetime, date
 import utils.ftu_formatter as ftu
 import utils.mapred as mapred
 import utils.dump_schema as schema
+import utils.payload_utils as payload
+import utils.date_window as window
+
+# Earliest submission and ping dates to process.
+earliest_submission, earliest_ping = window.get_window_dates('ftu')
 
 
 def consistent_ftu(r):
@@ -49,6 +54,15 @@ def map(key, dims, value, context):
     to the reducer for counting.
     """    
     mapred.increment_counter_tuple(context, 'nrecords')
+    # Skip records outside the date window.
+    if not payload.in_date_window(context, value, dims, earliest_submission,
+                                                earliest_ping, 'pingTime'):
+        return
+    # Sample by ping time, if required, before parsing.
+    # FTU pings have no device ID, but the ping time is stable across 
+    # resubmissions.
+    if not payload.sample_payload(context, value, 'pingTime'):
+        return
     
     try:
         r = json.loads(value)
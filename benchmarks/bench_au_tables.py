@@ -0,0 +1,113 @@
+"""
+Benchmark memory use of the AU tables held by postprocessing/au_data_tables.py.
+
+Compares storing the info, app and search rows as lists of lists (the
+previous layout) against the column-oriented tables in
+utils/column_table.py. Rows are generated as synthetic job output records and
+parsed the same way as the job output, so that each row holds its own copies
+of the string values. Memory is reported per million rows, along with the
+time to iterate over all rows (as when writing the CSVs).
+
+Optional command-line args are the number of devices and the number of pings
+per device.
+"""
+
+import sys
+import ast
+import csv
+import random
+import time
+
+import utils.dump_schema as schema
+from utils.column_table import ColumnTable
+
+
+def make_records(ndevices, npings, seed = 0):
+    """Generate AU rows as (table name, row) pairs by parsing the string
+    representations of synthetic records.
+    """
+    rng = random.Random(seed)
+    apps = ['app://app%s.gaiamobile.org/manifest.webapp' % i
+        for i in range(40)]
+    for d in range(ndevices):
+        device_id = u'%08x-0000-0000-0000-%012x' % (d, d)
+        dogfood = d % 10 == 0
+        t = 1433116800000 + rng.randrange(10 ** 8)
+        os_version = rng.choice([u'2.0 (pre-release)', u'2.1 (pre-release)'])
+        for p in range(npings):
+            start, stop = t, t + 3600000
+            t = stop + rng.randrange(10 ** 6)
+            day = '2015-06-%02d' % (1 + p % 28)
+            key = [device_id, start, stop]
+            info = [day, day, day, os_version, '', u'Flame', '', '',
+                u'nightly', u'nightly', u'32.0', u'20150601'] + [''] * 10 + [
+                480, 854, '', '', '', '', dogfood]
+            yield 'info', ast.literal_eval(repr(key + info))
+            for a in rng.sample(apps, rng.randrange(1, 8)):
+                app = [a, day, rng.randrange(1000), rng.randrange(10), 0, '',
+                    '', '', '', (('act0', rng.randrange(1, 4)),), dogfood]
+                yield 'app', ast.literal_eval(repr(key + app))
+            search = [u'google', day, rng.randrange(5), dogfood]
+            yield 'search', ast.literal_eval(repr(key + search))
+
+
+def deep_sizeof(obj, seen = None):
+    """Total size in bytes of an object and the objects it references."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.iteritems():
+            size += deep_sizeof(k, seen) + deep_sizeof(v, seen)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            size += deep_sizeof(v, seen)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(obj.__dict__, seen)
+    return size
+
+
+def iterate_rows(tables):
+    """Time writing all rows to a CSV writer that discards them."""
+    class Discard(object):
+        def write(self, s):
+            pass
+    writer = csv.writer(Discard())
+    start = time.time()
+    for name in ['info', 'app', 'search']:
+        for r in tables[name]:
+            writer.writerow([unicode(v).encode('utf-8') for v in r])
+    return time.time() - start
+
+
+def main(ndevices = 1000, npings = 50):
+    list_tables = {'info': [], 'app': [], 'search': []}
+    dictionaries = {}
+    column_tables = {}
+    for name, keys in schema.au_table_keys.iteritems():
+        column_tables[name] = ColumnTable(keys, schema.au_int_keys,
+            dictionaries)
+    for name, row in make_records(ndevices, npings):
+        list_tables[name].append(row)
+        column_tables[name].append(row)
+    nrows = sum(map(len, list_tables.values()))
+    
+    print('%s rows (%s info, %s app, %s search)' % (nrows,
+        len(list_tables['info']), len(list_tables['app']),
+        len(list_tables['search'])))
+    print('%-16s %14s %12s' % ('', 'MB/1M rows', 'iterate (s)'))
+    for label, tables in [('lists', list_tables),
+            ('ColumnTable', column_tables)]:
+        size = deep_sizeof(tables)
+        print('%-16s %14.1f %12.3f' % (label, size * 1e6 / nrows / 2 ** 20,
+            iterate_rows(tables)))
+    # Check that the layouts hold the same rows.
+    for name in list_tables:
+        assert list(column_tables[name]) == list_tables[name]
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
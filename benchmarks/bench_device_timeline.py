@@ -0,0 +1,136 @@
+"""
+Benchmark AU ping overlap classification and membership checks.
+
+Compares the original list-based approach in postprocessing/au_data_tables.py 
+(classification loop, then a linear search of the retained pings for each 
+info and app row) against utils.device_timeline.DeviceTimeline, on synthetic 
+devices with thousands of pings. If NumPy is available, the vectorized 
+classification across all devices is also timed.
+
+Optional command-line args are the number of devices, the number of pings 
+per device, and the number of app rows per ping.
+"""
+
+import sys
+import random
+import time
+from collections import defaultdict
+
+import utils.device_timeline as timeline_utils
+from utils.device_timeline import DeviceTimeline
+
+
+def make_pings(npings, seed = 0):
+    """Generate a shuffled list of (start, stop) pings for a device, 
+    including some with clock skew, nesting and overlap.
+    """
+    rng = random.Random(seed)
+    pings = []
+    t = 1433116800000
+    for i in range(npings):
+        r = rng.random()
+        if r < 0.02:
+            pings.append((t + 1000, t))
+        elif r < 0.05:
+            pings.append((t - 50000, t - 10000))
+        elif r < 0.1:
+            pings.append((t - rng.choice([2000, 60000]), t + 3600000))
+        else:
+            pings.append((t, t + 3600000))
+            t += 3600000 + rng.randrange(10 ** 6)
+    pings = list(set(pings))
+    rng.shuffle(pings)
+    return pings
+
+
+def list_classify(all_pings, overlap_tolerance = 5000):
+    """The original classification loop, for comparison."""
+    counts = defaultdict(int)
+    pings_to_keep = []
+    all_pings.sort()
+    for current_ping in all_pings:
+        should_keep = True
+        if current_ping[0] > current_ping[1]:
+            should_keep = False
+            counts['clockskew'] += 1
+        elif pings_to_keep:
+            last_stop = pings_to_keep[-1][1]
+            if current_ping[0] < last_stop:
+                if current_ping[1] <= last_stop:
+                    should_keep = False
+                    counts['nested'] += 1
+                elif last_stop - current_ping[0] < overlap_tolerance:
+                    counts['negligibleoverlap'] += 1
+                else:
+                    counts['overlap'] += 1
+        if should_keep:
+            pings_to_keep.append(current_ping)
+    return (pings_to_keep or all_pings), dict(counts)
+
+
+def run_list(devices, app_rows):
+    start = time.time()
+    kept = 0
+    for pings in devices:
+        retained, counts = list_classify(list(pings))
+        for p in pings:
+            for i in range(app_rows + 1):
+                kept += p in retained
+    return time.time() - start, kept
+
+
+def run_timeline(devices, app_rows):
+    start = time.time()
+    kept = 0
+    for pings in devices:
+        timeline = DeviceTimeline(pings)
+        counts = timeline.classify()
+        for p in pings:
+            for i in range(app_rows + 1):
+                kept += p in timeline
+    return time.time() - start, kept
+
+
+def run_vectorized(devices, app_rows):
+    device_ids, starts, stops = [], [], []
+    for i, pings in enumerate(devices):
+        for p in pings:
+            device_ids.append(i)
+            starts.append(p[0])
+            stops.append(p[1])
+    start = time.time()
+    timelines, counts = timeline_utils.classify_devices(device_ids, starts, 
+        stops)
+    kept = 0
+    for i, pings in enumerate(devices):
+        timeline = timelines[i]
+        for p in pings:
+            for j in range(app_rows + 1):
+                kept += p in timeline
+    return time.time() - start, kept
+
+
+def main(ndevices = 20, npings = 3000, app_rows = 3):
+    devices = [make_pings(npings, seed) for seed in range(ndevices)]
+    # Check that classification agrees before timing.
+    for pings in devices:
+        retained, counts = list_classify(list(pings))
+        timeline = DeviceTimeline(pings)
+        assert timeline.classify() == counts
+        assert list(timeline) == retained
+    
+    print('%s devices x %s pings, %s app rows per ping' % 
+        (ndevices, npings, app_rows))
+    t_list, kept_list = run_list(devices, app_rows)
+    t_timeline, kept_timeline = run_timeline(devices, app_rows)
+    assert kept_list == kept_timeline
+    print('%-20s %8.3f s' % ('list', t_list))
+    print('%-20s %8.3f s' % ('DeviceTimeline', t_timeline))
+    if timeline_utils.np is not None:
+        t_vectorized, kept_vectorized = run_vectorized(devices, app_rows)
+        assert kept_vectorized == kept_list
+        print('%-20s %8.3f s' % ('classify_devices', t_vectorized))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:4]])
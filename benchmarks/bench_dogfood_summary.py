@@ -0,0 +1,108 @@
+"""
+Benchmark the foxfood device summaries in postprocessing/au_data_tables.py 
+with different numbers of processes, and with app usage aggregated from the 
+column tables using NumPy, if available.
+
+Tables are generated as in bench_au_tables.py, where every tenth device is a
+foxfood device. Optional command-line args are the number of devices, the 
+number of pings per device, and the maximum number of processes (by default,
+the number of CPUs).
+
+With 'scaling' as the first arg, the time for a single process is instead 
+compared against a pool for increasing numbers of devices, to find where the
+pool starts to pay off (see min_devices_per_process in au_data_tables.py). 
+Optional further args are the number of pings per device and the number of
+processes in the pool (by default, 2).
+"""
+
+import sys
+import time
+import multiprocessing
+from collections import defaultdict
+
+import utils.dump_schema as schema
+from utils.column_table import ColumnTable
+import postprocessing.au_data_tables as au
+from benchmarks.bench_au_tables import make_records
+
+
+def make_tables(ndevices, npings):
+    """Generate the AU tables, as lists of rows and as column tables, with 
+    all pings retained.
+    """
+    tables = defaultdict(list)
+    column_tables = {}
+    dictionaries = {}
+    for name, keys in schema.au_table_keys.iteritems():
+        column_tables[name] = ColumnTable(keys, schema.au_int_keys,
+            dictionaries)
+    for name, row in make_records(ndevices, npings):
+        tables[name].append(row)
+        column_tables[name].append(row)
+    # All pings are retained.
+    pings_by_device = defaultdict(set)
+    is_dogfood_device = {}
+    for row in tables['info']:
+        pings_by_device[row[0]].add((row[1], row[2]))
+        is_dogfood_device[row[0]] = row[-1]
+    return tables, column_tables, pings_by_device, is_dogfood_device
+
+
+def time_summary(tables, pings_by_device, is_dogfood_device, processes):
+    start = time.time()
+    au.summarize_dogfood(tables, pings_by_device, is_dogfood_device, 
+        processes)
+    return time.time() - start
+
+
+def scaling(npings = 50, processes = 2):
+    """Time a single process against a pool of the given size for 
+    increasing numbers of devices.
+    """
+    # Always use the pool, however few devices there are.
+    au.min_devices_per_process = 1
+    print('%s pings per device, pool of %s processes' % (npings, processes))
+    print('%16s %10s %10s' % ('foxfood devices', '1 process', 'pool'))
+    for ndevices in [100, 500, 1000, 2500, 5000, 10000, 20000]:
+        tables, column_tables, pings_by_device, is_dogfood_device = \
+            make_tables(ndevices, npings)
+        print('%16s %8.3f s %8.3f s' % (sum(is_dogfood_device.values()), 
+            time_summary(tables, pings_by_device, is_dogfood_device, 1),
+            time_summary(tables, pings_by_device, is_dogfood_device, 
+                processes)))
+
+
+def main(ndevices = 2000, npings = 50, max_processes = None):
+    if max_processes is None:
+        max_processes = multiprocessing.cpu_count()
+    # Use all the processes requested.
+    au.min_devices_per_process = 1
+    tables, column_tables, pings_by_device, is_dogfood_device = \
+        make_tables(ndevices, npings)
+    print('%s foxfood devices, %s pings per device' % 
+        (sum(is_dogfood_device.values()), npings))
+    expected = None
+    for processes in range(1, max_processes + 1):
+        start = time.time()
+        result = au.summarize_dogfood(tables, pings_by_device, 
+            is_dogfood_device, processes)
+        print('%3s processes: %8.3f s' % (processes, time.time() - start))
+        if expected is None:
+            expected = result
+        assert result == expected
+    if au.summary_utils.np is None:
+        return
+    for vectorized in [False, True]:
+        start = time.time()
+        result = au.summarize_dogfood(column_tables, pings_by_device, 
+            is_dogfood_device, 1, vectorized)
+        print('column tables, %s app usage: %8.3f s' % 
+            ('vectorized' if vectorized else 'per-row', time.time() - start))
+        assert result == expected
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['scaling']:
+        scaling(*[int(a) for a in sys.argv[2:4]])
+    else:
+        main(*[int(a) for a in sys.argv[1:4]])
@@ -0,0 +1,111 @@
+"""
+Benchmark the accumulation of FTU dashboard rows in 
+postprocessing/ftu_dashboard_datasets.py.
+
+Synthetic FTU records are generated from small pools of raw field values, 
+including values which are not whitelisted. Timings are reported for 
+summarizing every row with the functions in utils/ftu_formatter.py, as was 
+originally done, and for accumulate_dashboard_row(), which looks up the 
+summary of each distinct raw value once. Each timing is the total time to 
+accumulate all the records (best of 3 runs), followed by the average time 
+per record.
+
+Optional command-line args are the number of records and the number of 
+distinct values per field.
+"""
+
+import sys
+import random
+import timeit
+from datetime import date, timedelta
+
+import utils.ftu_formatter as ftu
+import utils.dump_schema as schema
+import postprocessing.ftu_dashboard_datasets as dash
+
+field_index = dash.field_index
+
+
+def make_records(nrecords, nvalues):
+    """Generate synthetic FTU records as lists of values in the order of 
+    schema.final_keys, with a count appended.
+    """
+    random.seed(1)
+    ftu.load_whitelist()
+    today = date.today()
+    dates = [(today - timedelta(days = d)).isoformat() for d in range(180)]
+    pools = {
+        'os': ['1.%s' % i for i in range(nvalues / 2)] + 
+            ['2.%s' % i for i in range(nvalues / 2)],
+        'country': sorted(ftu.lookup['countrylist'])[:nvalues / 2] + 
+            ['Country %s' % i for i in range(nvalues / 2)],
+        'product_model': ['%s %s' % (random.choice(ftu.lookup['devicelist']), 
+            i) for i in range(nvalues / 2)] + 
+            ['Device %s' % i for i in range(nvalues / 2)] + [''],
+        'network': sorted(ftu.lookup['operatorlist'])[:nvalues / 2] + 
+            ['Operator %s' % i for i in range(nvalues / 2)] + ['']
+    }
+    records = []
+    for i in xrange(nrecords):
+        r = [''] * len(schema.final_keys)
+        r[field_index['submissionDate']] = random.choice(dates)
+        for k in 'os', 'country', 'product_model':
+            r[field_index[k]] = random.choice(pools[k])
+        for k in 'icc.network', 'icc.name', 'network.network', 'network.name':
+            r[field_index[k]] = random.choice(pools['network'])
+        r.append(random.randint(1, 5))
+        records.append(r)
+    return records
+
+
+def accumulate_per_row(dataset, raw_row):
+    """The original summarization of each row, for comparison."""
+    new_row = (
+        raw_row[field_index['submissionDate']],
+        ftu.summarize_os(raw_row[field_index['os']]),
+        ftu.summarize_country(raw_row[field_index['country']]),
+        ftu.summarize_device(raw_row[field_index['product_model']]),
+        ftu.summarize_operator(
+            raw_row[field_index['icc.network']], 
+            raw_row[field_index['icc.name']], 
+            raw_row[field_index['network.network']], 
+            raw_row[field_index['network.name']])
+    )
+    dataset[new_row] = dataset.get(new_row, 0) + raw_row[-1]
+
+
+def accumulate(records, accumulate_row):
+    dataset = {}
+    for r in records:
+        accumulate_row(dataset, r)
+    return dataset
+
+
+def time_call(f, number):
+    """Return the best average time per call in s over 3 repeats of the 
+    given number of calls.
+    """
+    return min(timeit.repeat(f, repeat = 3, number = number)) / number
+
+
+def main(nrecords = 200000, nvalues = 40):
+    records = make_records(nrecords, nvalues)
+    # Check that the implementations agree before timing.
+    assert (accumulate(records, accumulate_per_row) == 
+        accumulate(records, dash.accumulate_dashboard_row))
+    print('%s records, %s distinct values per field' % (nrecords, nvalues))
+    
+    cases = [
+        ('per-row summaries', 
+            lambda: accumulate(records, accumulate_per_row)),
+        ('summary tables', 
+            lambda: accumulate(records, dash.accumulate_dashboard_row))
+    ]
+    for name, f in cases:
+        total = time_call(f, 1)
+        print('%-20s %8.3f s total per run, %6.2f us per record' % (name, 
+            total, total / nrecords * 1e6))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
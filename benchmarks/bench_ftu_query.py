@@ -0,0 +1,86 @@
+"""
+Benchmark count queries over the FTU aggregate with the bitmap indexes in 
+postprocessing/ftu_query.py.
+
+A synthetic aggregate is generated with the dimensions of the dump store 
+counts (the dashboard dimensions and update channel), with skewed value 
+frequencies. Timings are reported for building the index, and for a set of 
+typical filtered and grouped queries answered from the index and by scanning 
+all rows.
+
+Optional command-line arg is the number of aggregate rows.
+"""
+
+import sys
+import random
+import timeit
+from datetime import date, timedelta
+
+import postprocessing.ftu_query as query
+
+# Number of distinct values for each dimension other than date.
+cardinalities = {
+    'os': 12,
+    'country': 40,
+    'device': 30,
+    'operator': 40,
+    'channel': 4
+}
+
+
+def make_rows(nrows, ndays = 180):
+    """Generate synthetic aggregate rows for the dump store dimensions."""
+    random.seed(1)
+    today = date.today()
+    dates = [(today - timedelta(days = d)).isoformat() for d in range(ndays)]
+    rows = []
+    for i in xrange(nrows):
+        row = [random.choice(dates)]
+        for dim in query.dump_dimensions[1:]:
+            # Skew towards the lower-numbered values.
+            n = cardinalities[dim]
+            row.append('%s %s' % (dim, min(int(random.expovariate(5. / n)), 
+                n - 1)))
+        row.append(random.randint(1, 100))
+        rows.append(row)
+    return rows
+
+
+def time_call(f, number):
+    """Return the best average time per call in ms over 3 repeats."""
+    return min(timeit.repeat(f, repeat = 3, number = number)) / number * 1000
+
+
+def main(nrows = 200000):
+    rows = make_rows(nrows)
+    dims = query.dump_dimensions
+    today = date.today()
+    last_month = (today - timedelta(days = 30)).isoformat()
+    last_quarter = (today - timedelta(days = 90)).isoformat()
+    queries = [
+        ('total', {}),
+        ('one country, last month', 
+            {'start': last_month, 'country': 'country 0'}),
+        ('by os', {'group_by': ['os']}),
+        ('by date, two devices', 
+            {'group_by': ['date'], 'device': ['device 0', 'device 3']}),
+        ('by country x operator, quarter', 
+            {'start': last_quarter, 'group_by': ['country', 'operator'], 
+                'channel': 'channel 0'}),
+        ('by all dims', {'group_by': dims})
+    ]
+    print('%s aggregate rows' % nrows)
+    print('build index: %10.1f ms' % 
+        time_call(lambda: query.CountIndex(dims, rows), 1))
+    index = query.CountIndex(dims, rows)
+    print('%-34s %10s %10s' % ('', 'index (ms)', 'scan (ms)'))
+    for name, kw in queries:
+        # Check that the results agree before timing.
+        assert index.count(**kw) == query.scan_counts(dims, rows, **kw)
+        print('%-34s %10.2f %10.2f' % (name, 
+            time_call(lambda: index.count(**kw), 10), 
+            time_call(lambda: query.scan_counts(dims, rows, **kw), 1)))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
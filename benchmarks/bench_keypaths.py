@@ -0,0 +1,111 @@
+"""
+Benchmark the nested dict flatteners in utils/payload_utils.py.
+
+Synthetic AU payloads are generated with a large 'apps' map (many app URLs, 
+each with many usage dates), and additional deep nesting. Timings are 
+reported for the original recursive search_nested_dict() and the stack-based 
+walk_nested_dict(), both with and without excluding the app and search maps 
+(as is done in awsjobs/adhoc/unique_keys.py).
+
+Optional command-line args are the number of apps and the number of dates 
+per app.
+"""
+
+import sys
+import timeit
+
+import utils.payload_utils as payload
+
+# Paths excluded in the unique_keys job.
+exclude_paths = (['info', 'apps'], ['info', 'searches'])
+
+
+def make_au_payload(napps, ndates, depth = 8):
+    """Generate a synthetic AU payload with the given number of apps and 
+    usage dates per app, and a chain of nested dicts of the given depth.
+    """
+    apps = {}
+    for i in range(napps):
+        appurl = 'app://app%s.gaiamobile.org/manifest.webapp' % i
+        apps[appurl] = {}
+        for j in range(ndates):
+            apps[appurl]['201506%02d' % (j % 30 + 1)] = {
+                'usageTime': 1000 * j,
+                'invocations': j,
+                'installs': 0,
+                'uninstalls': 0,
+                'activities': {'view': j, 'pick': 1}
+            }
+    searches = {}
+    for provider in ('google', 'bing', 'yahoo'):
+        searches[provider] = dict(('201506%02d' % d, {'count': d}) 
+            for d in range(1, 29))
+    deep = 'leaf'
+    for d in range(depth):
+        deep = {'level%s' % d: deep, 'value%s' % d: d}
+    return {
+        'ver': 3,
+        'info': {
+            'reason': 'appusage',
+            'appName': 'FirefoxOS',
+            'deviceID': '0123456789abcdef0123456789abcdef0123',
+            'start': 1433116800000,
+            'stop': 1433203200000,
+            'deviceinfo': {
+                'deviceinfo.os': '2.2.0.0-prerelease',
+                'deviceinfo.product_model': 'Flame',
+                'deviceinfo.update_channel': 'nightly'
+            },
+            'simInfo': {
+                'icc': {'mcc': '310', 'mnc': '260', 'spn': 'T-Mobile'},
+                'network': {'mcc': '310', 'mnc': '260', 'operator': 'T-Mobile'}
+            },
+            'screen': {'width': 480, 'height': 854},
+            'apps': apps,
+            'searches': searches,
+            'deep': deep
+        }
+    }
+
+
+def recursive_keypaths(adict, exclude = ()):
+    """The original recursive keypath extraction, for comparison."""
+    keys = list()
+    if len(exclude) > 0:
+        exclude = ['|'.join(path) for path in exclude]
+    payload.search_nested_dict(adict, keys, exclude = exclude, keysonly = True)
+    return keys
+
+
+def time_call(f, number):
+    """Return the best average time per call in ms over 3 repeats."""
+    return min(timeit.repeat(f, repeat = 3, number = number)) / number * 1000
+
+
+def main(napps = 200, ndates = 30):
+    r = make_au_payload(napps, ndates)
+    # Check that the implementations agree before timing.
+    assert sorted(recursive_keypaths(r)) == sorted(payload.get_keypaths(r))
+    assert (sorted(recursive_keypaths(r, exclude_paths)) == 
+        sorted(payload.get_keypaths(r, exclude_paths)))
+    nkeys = len(payload.get_keypaths(r))
+    print('Payload with %s apps x %s dates: %s keypaths' % 
+        (napps, ndates, nkeys))
+    
+    number = 20
+    cases = [
+        ('recursive, full', lambda: recursive_keypaths(r)),
+        ('stack, full', lambda: payload.get_keypaths(r)),
+        ('stack, full, tuple paths', 
+            lambda: payload.get_keypaths(r, aspaths = True)),
+        ('recursive, excluding apps', 
+            lambda: recursive_keypaths(r, exclude_paths)),
+        ('stack, excluding apps', 
+            lambda: payload.get_keypaths(r, exclude_paths))
+    ]
+    for name, f in cases:
+        print('%-28s %8.3f ms' % (name, time_call(f, number)))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
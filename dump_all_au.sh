@@ -8,14 +8,15 @@ if [ $# -gt 0 ] && [ "$1" = "--nolog" ]; then
 fi
 
 
-# Dump all FxOS AU records from the start date to the present.
-#START_DATE=`date +%Y%m%d -d "-9 months"`
-START_DATE=20150101
-
 CURRENT_DIR=$(pwd)
 SRC_DIR=$(cd "`dirname "$0"`"; pwd)
 TELEMETRY_SERVER_DIR=$HOME/telemetry-server
 
+# Dump all FxOS AU records from the start date to the present.
+# The start date is determined by the AU window in utils/date_window.py.
+#START_DATE=`date +%Y%m%d -d "-9 months"`
+START_DATE=`cd "$SRC_DIR"; python -m utils.date_window au`
+
 OUTPUT_DIR="$CURRENT_DIR/output"
 OUTPUT_FILE="$OUTPUT_DIR/au_raw.out"
 LOG_FILE="$OUTPUT_DIR/au_raw.log"
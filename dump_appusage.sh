@@ -8,15 +8,21 @@ if [ $# -gt 0 ] && [ "$1" = "--nolog" ]; then
 fi
 
 
-# Dump all FxOS FTU records from the start date to the present.
-# START_DATE=`date +%Y%m%d -d "-9 months"`
-START_DATE=20150101
-
 CURRENT_DIR=$(pwd)
 SRC_DIR=$(cd "`dirname "$0"`"; pwd)
 TELEMETRY_SERVER_DIR=$HOME/telemetry-server
 
-# . settings.env
+# Dump all FxOS FTU records from the start date to the present.
+. settings.env
+
+# The start date is determined by the AU window in utils/date_window.py.
+# In incremental mode, only the latest dates are dumped.
+# START_DATE=`date +%Y%m%d -d "-9 months"`
+if [ "$AU_INCREMENTAL" = "true" ]; then
+    START_DATE=`cd "$SRC_DIR"; python -m utils.date_window au --incremental`
+else
+    START_DATE=`cd "$SRC_DIR"; python -m utils.date_window au`
+fi
 
 OUTPUT_DIR="$CURRENT_DIR/output"
 OUTPUT_FILE="$OUTPUT_DIR/au_data.out"
@@ -46,6 +52,29 @@ if [ ! -d "$DATA_DIR" ]; then
 fi
 
 JOB_FILE=$SRC_DIR/dump_format_appusage.py
+if [ "$AU_REDUCE_BY_DEVICE" = "true" ]; then
+    JOB_FILE=$SRC_DIR/dump_format_appusage_bydevice.py
+fi
+export FXOS_AU_COMPACT_KEYS="$AU_COMPACT_KEYS"
+# For incremental runs, download the latest filter of previously seen 
+# payloads. A filter that was not uploaded since yesterday was written before 
+# the last run's output was processed, and may still contain payloads since
+# found to be incomplete, so the job runs without it.
+if [ "$AU_INCREMENTAL" = "true" ] && [ -n "$AU_SEEN_FILTER_S3" ]; then
+    SEEN_FILTER_PATH="$WORK_DIR/$AU_SEEN_FILTER"
+    rm -f "$SEEN_FILTER_PATH"
+    FILTER_UPLOADED=`aws s3 ls "$AU_SEEN_FILTER_S3" | \
+        grep -Eo "^[0-9]{4}(-[0-9]{2}){2}"`
+    if [ -z "$FILTER_UPLOADED" ] || \
+            [[ "$FILTER_UPLOADED" < "$(date +%Y-%m-%d -d yesterday)" ]]; then
+        echo "Filter of seen payloads is missing or out of date" \
+            "(uploaded: ${FILTER_UPLOADED:-never}). Running without it."
+    elif aws s3 cp "$AU_SEEN_FILTER_S3" "$SEEN_FILTER_PATH"; then
+        export FXOS_AU_SEEN_FILTER="$SEEN_FILTER_PATH"
+    else
+        echo "Failed to download filter of seen payloads. Running without it."
+    fi
+fi
 FILTER=$SRC_DIR/filter.json
 
 cp "$SRC_DIR/all_fxos_date.json" $FILTER
@@ -8,16 +8,22 @@ if [ $# -gt 0 ] && [ "$1" = "--nolog" ]; then
 fi
 
 
-# Dump all FxOS FTU records from the start date to the present.
-START_DATE=`date +%Y%m%d -d "-9 months"`
-# START_DATE=20140401
-
 CURRENT_DIR=$(pwd)
 SRC_DIR=$(cd "`dirname "$0"`"; pwd)
 TELEMETRY_SERVER_DIR=$HOME/telemetry-server
 
 . settings.env
 
+# Dump all FxOS FTU records from the start date to the present.
+# The start date is determined by the FTU window in utils/date_window.py.
+# In incremental mode, only the latest dates are dumped.
+# START_DATE=`date +%Y%m%d -d "-9 months"`
+if [ "$FTU_INCREMENTAL" = "true" ]; then
+    START_DATE=`cd "$SRC_DIR"; python -m utils.date_window ftu --incremental`
+else
+    START_DATE=`cd "$SRC_DIR"; python -m utils.date_window ftu`
+fi
+
 OUTPUT_DIR=$CURRENT_DIR/$OUTPUT_DIR_NAME
 OUTPUT_FILE=$OUTPUT_DIR/$DUMP_FILE
 LOG_FILE=$OUTPUT_DIR/$JOB_LOG_FILE
@@ -13,6 +13,8 @@ cd $BASE_DIR
 # Run AWS job from a flatter configuration. 
 # Add symlinks to flatten structure when archiving.
 ln -s $BASE_DIR/awsjobs/dump_format_appusage.py $BASE_DIR/dump_format_appusage.py
+ln -s $BASE_DIR/awsjobs/dump_format_appusage_bydevice.py \
+    $BASE_DIR/dump_format_appusage_bydevice.py
 ln -s $BASE_DIR/awsjobs/filters/all_fxos_date.json $BASE_DIR/all_fxos_date.json
 
 # The utils dir needs to be inside the jobs dir to the job to run correctly.
@@ -21,13 +23,16 @@ ln -s $BASE_DIR/awsjobs/filters/all_fxos_date.json $BASE_DIR/all_fxos_date.json
 
 tar cvfz "$TARGET_DIR/${1:-au-dump-0.1.tar.gz}" -h \
     dump_format_appusage.py \
+    dump_format_appusage_bydevice.py \
     all_fxos_date.json \
     utils/*.py \
     utils/lookup \
+    settings.env \
     dump_appusage.sh
     
 # Remove symlink. 
 unlink $BASE_DIR/dump_format_appusage.py
+unlink $BASE_DIR/dump_format_appusage_bydevice.py
 unlink $BASE_DIR/all_fxos_date.json
 
 exit 0
@@ -3,17 +3,32 @@ Load the AU data outputted by the map-reduce job, and convert to CSV.
 
 The script expects the following command-line args:
 - the path to the map-reduce output file, which is the input to this script
-- the dir path to contain the output CSVs.
+- the dir path to contain the output CSVs
+- optionally, the foxfood dir path containing the list of foxfood IMEIs, to
+  write the inactive foxfooder report to (see inactive_foxfooders.py).
+
+The number of processes used for the foxfood summaries can be set using the 
+environment variable FXOS_AU_PROCESSES (see AU_PROCESSES in settings.env).
 """
 
+import os
 import sys
 import csv
 import ast
 import os.path
+import zlib
+import multiprocessing
 
 import utils.mapred as mapred
 import utils.dump_schema as schema
+import utils.device_timeline as timeline_utils
+from utils.device_timeline import DeviceTimeline
+from utils.column_table import ColumnTable
+import utils.dogfood_summary as summary_utils
+from utils.dogfood_summary import (summarize_devices, dogfood_details_row, 
+    dogfood_history_rows, dogfood_appusage_rows)
 import output_utils as util
+import inactive_foxfooders as foxfood_report
 from collections import defaultdict
 
 # Output CSV naming.
@@ -21,74 +36,129 @@ info_csv = 'info.csv'
 app_csv = 'app.csv'
 search_csv = 'search.csv'
 dogfood_details_csv = 'dogfood_details.csv'
+dogfood_history_csv = 'dogfood_history.csv'
 dogfood_appusage_csv = 'dogfood_appusage.csv'
 
+# Number of processes to summarize foxfood devices across (by default, the 
+# number of CPUs). Set using the environment variable FXOS_AU_PROCESSES.
+summary_processes = int(os.environ.get('FXOS_AU_PROCESSES') or 
+    multiprocessing.cpu_count())
+# Minimum number of foxfood devices per process. Below this, starting the
+# pool and shipping the partitions to it costs more than it saves (see 
+# benchmarks/bench_dogfood_summary.py).
+min_devices_per_process = 500
 
-def main(job_output, csv_dir):
-    """Load map-reduce output and split records into tables.
-    
-    Count duplicates and write relevant subsets to CSVs.
-    
-    Data from the raw payloads are split into three groups that are each
-    recorded in a separate table: 
-    - top-level device/OS info ("info")
-    - daily app usage ("app")
-    - daily search counts ("search")
-    These are recorded per payload, which are identified using (deviceID,
-    start time, stop time).
-    
-    Next, the payloads from foxfood devices are joined by device, 
-    and aggregate top-level info and daily app usage data are reported 
-    separately.
-    
-    Some diagnostics are also reported around joining pings from the same
-    device. Ideally the start-to-stop time periods should be sequential with
-    negligible overlap, although this is not always the case.
+# Position of the activities field in app rows. Activities are recorded in the
+# job output as tuples of (activity, count) pairs.
+app_activities_index = schema.au_app_csv.index('activities')
+
+
+def format_activities(activities):
+    """Format activity counts as a string 'activity:count;...' for CSV.
     
-    Currently fields in the key and value are referred to by positional index,
-    which is quick but non-transparent and non-robust. The ordering for the 
-    fields are determined by the 'au_{...}_{...}_keys' lists in 
-    ../utils/dump_schema.py.
+    Activities are listed in the order of the pairs, ie. sorted by activity
+    as recorded by the job (previously they were in arbitrary dict order).
+    """
+    return ';'.join(['%s:%s' % a for a in activities])
+
+
+def parse_activities(activities):
+    """Parse activity counts written by format_activities() back to a tuple
+    of (activity, count) pairs.
     """
-    # Parse raw data
-    # -------------- 
+    if not activities:
+        return ''
+    pairs = [a.rsplit(':', 1) for a in activities.split(';')]
+    return tuple([(a, int(n)) for a, n in pairs])
+
+
+def format_row(name, row):
+    """Format a row of the named table for writing to CSV."""
+    if name == 'app' and row[app_activities_index]:
+        row = list(row)
+        row[app_activities_index] = format_activities(
+            row[app_activities_index])
+    return row
+
+
+def read_records(job_output, output):
+    """Iterate over the AU records in the map-reduce output in a single pass.
     
-    output = mapred.parse_output_tuple(job_output)
-    data = []
-    for r in output['records']:
+    Each line is parsed once, and yielded as a triple: the record type 
+    ('info', 'app', 'search' or 'seen'), the payload key as a list (deviceID,
+    start, stop), and the list of value fields with the type tag removed. 
+    Start and stop times and counts are parsed as ints. Counters and 
+    conditions are stored in the dict output as they are encountered.
+    """
+    for key, value in mapred.iter_output_tuple(job_output, output):
         # The MR value is a list or tuple stored as its string representation.
-        vals = ast.literal_eval(r.pop())
-        # Convert the MR value to a list and join it to the key, a tuple.
-        data.append(r + list(vals))
+        fields = list(ast.literal_eval(value))
+        type = fields.pop()
+        yield type, key, fields
+
+
+def iter_table_rows(job_output, output, duplicate_counts, multiple_info):
+    """Iterate over the rows of the AU tables in the map-reduce output.
     
-    # Split records into tables for info, app activity, and search.
-    # Also keep count of duplicate records and cases with multiple records.
-    tables = defaultdict(list)
-    # Maintain separate counts for dogfooders and others.
-    duplicate_counts = defaultdict(lambda: defaultdict(int))
-    multiple_info = []
-    for d in data:
-        type = d.pop()
+    Yields pairs of table name ('info', 'app', 'search' or 'seen') and row.
+    Counters and conditions are stored in the dict output. Duplicate 
+    submissions of info records are counted in duplicate_counts, and info 
+    records for payloads which had multiple unique info records are appended 
+    to the list multiple_info rather than yielded.
+    """
+    for type, row, fields in read_records(job_output, output):
+        # Join the MR value to the key.
+        row.extend(fields)
         if type == 'info': 
             # First check for the multiple rows tag.
-            if d[0].startswith('multiple:'):
+            if row[0].startswith('multiple:'):
                 # In this case, save these records separately.
-                multiple_info.append(d)
+                multiple_info.append(row)
                 continue
-            n = d.pop()
+            n = row.pop()
             if n > 1:
                 # Make a note of any duplicates.
-                dupes = duplicate_counts['dogfood' if d[-1] else 'general']
+                dupes = duplicate_counts['dogfood' if row[-1] else 'general']
                 dupes['payloads'] += 1
                 dupes['total'] += n
-        tables[type].append(d)
+        yield type, row
+
+
+def load_tables(job_output):
+    """Load map-reduce output and split records into tables.
+    
+    Returns the parsed output (counters and conditions), a dict mapping table 
+    names ('info', 'app', 'search') to tables of rows, counts of duplicate 
+    submissions for dogfooders and others, and the list of payloads which had
+    multiple unique info records.
     
-    # Dump flattened raw data and counts
-    # ----------------------------------
+    The info, app and search tables are stored by column (see 
+    utils/column_table.py), with columns given by the schema, and can be 
+    iterated over as lists of rows. String values are shared between tables.
+    """
+    # Parse raw data and split records into tables for info, app activity, 
+    # and search. 
+    # Also keep count of duplicate records and cases with multiple records.
+    output = {'counters': {}, 'conditions': {}}
+    tables = defaultdict(list)
+    dictionaries = {}
+    for name, keys in schema.au_table_keys.iteritems():
+        tables[name] = ColumnTable(keys, schema.au_int_keys, dictionaries)
+    # Maintain separate counts for dogfooders and others.
+    duplicate_counts = defaultdict(lambda: defaultdict(int))
+    multiple_info = []
+    for type, row in iter_table_rows(job_output, output, duplicate_counts, 
+            multiple_info):
+        tables[type].append(row)
     
-    # Print some statistics about the job and the dataset.
+    return output, tables, duplicate_counts, multiple_info
+
+
+def print_job_stats(output, duplicate_counts, multiple_info):
+    """Print statistics about the job and the dataset."""
     print('Counters:')
     util.print_counter_info(output['counters'])
+    util.print_sampling_info(output['counters'])
     print('\nError conditions:')
     util.print_condition_info(output['conditions'])
     # Duplicates.
@@ -103,8 +173,10 @@ def main(job_output, csv_dir):
         print('\nSome payloads had multiple unique info records:')
         for r in multiple_info:
             print(r)
-    
-    # Write output CSVs of flattened raw data.
+
+
+def write_tables(tables, csv_dir):
+    """Write output CSVs of flattened raw data."""
     with open(os.path.join(csv_dir, info_csv), 'w') as outfile:
         writer = csv.writer(outfile)
         writer.writerow(schema.au_info_csv)
@@ -115,7 +187,7 @@ def main(job_output, csv_dir):
         writer = csv.writer(outfile)
         writer.writerow(schema.au_app_csv)
         for r in tables['app']:
-            util.write_unicode_row(writer, r)
+            util.write_unicode_row(writer, format_row('app', r))
     print('Wrote app CSV: %s rows' % len(tables['app']))
     with open(os.path.join(csv_dir, search_csv), 'w') as outfile:
         writer = csv.writer(outfile)
@@ -123,15 +195,25 @@ def main(job_output, csv_dir):
         for r in tables['search']:
             util.write_unicode_row(writer, r)
     print('Wrote search CSV: %s rows' % len(tables['search']))
+
+
+def classify_pings(tables, vectorized = None):
+    """Group pings by device, and identify conditions such as bad overlap.
     
-    # Group pings by device, and report on conditions such as bad overlap.
-    # --------------------------------------------------------------------
+    Returns a mapping of device IDs to timelines of their pings' (start, stop)
+    times (see utils/device_timeline.py), a mapping of device IDs to 
+    dogfooding flags, and counts of pings per condition and device.
     
+    If vectorized is True, pings for all devices are classified together 
+    using NumPy. By default, this is done if NumPy is available.
+    """
+    if vectorized is None:
+        vectorized = timeline_utils.np is not None
     # Summarize/aggregate data and write tables.
     # First check ping submissions for overlap.
     # Map device ID to its associated pings identified by (start, stop) times.
     # Also set up a reference list of which devices are dogfooding participants.
-    pings_by_device = defaultdict(list)
+    pings_by_device = defaultdict(DeviceTimeline)
     is_dogfood_device = {}
     inconsistent_dogfooding_flag = 0
     for row in tables['info']:
@@ -143,60 +225,35 @@ def main(job_output, csv_dir):
             if is_dogfood_device[device_id] != row[-1]:
                 # Shouldn't happen, but check anyway.
                 inconsistent_dogfooding_flag += 1
-        # Map deviceID to (start time, stop time).
-        pings_by_device[device_id].append((row[1], row[2]))
+        if not vectorized:
+            # Map deviceID to (start time, stop time).
+            pings_by_device[device_id].add(row[1], row[2])
     if inconsistent_dogfooding_flag:
         print('\nThere were inconsistent dogfooding flags')
     
-    # Ping times should be sequential: 
-    # previous stop time no later than current start time.
-    # Any ping time ranges completely contained in another ping time range
-    # can be removed as redundant.
-    # Otherwise, we may have non-trivial overlapping time ranges
-    # (a bug condition).
-    # In this case, don't remove the ping, but make a note of occurrences.
+    # Classify pings for each device, removing pings with clock skew or 
+    # nested inside the previous ping, and noting occurrences of overlap.
+    # See utils/device_timeline.py.
     condition_counts = defaultdict(lambda: defaultdict(int))
-    # Tolerance for overlap: 5 seconds.
-    overlap_tolerance = 5000
-    for device_id in pings_by_device:
-        pings_to_keep = []
-        all_pings = pings_by_device[device_id]
-        # Sort by increasing start time and then by decreasing stop time.
-        all_pings.sort()
-        for current_ping in all_pings:
-            should_keep = True
-            # Remove pings with start time later than stop time. 
-            # Means either a bug or system time was changed.
-            if current_ping[0] > current_ping[1]:
-                should_keep = False
-                condition_counts['clockskew'][device_id] += 1
-            # Otherwise check times against last good ping, if any.
-            elif pings_to_keep:
-                last_stop = pings_to_keep[-1][1]
-                if current_ping[0] < last_stop:
-                    # There is some overlap.
-                    if current_ping[1] <= last_stop:
-                        # Current ping is contained in last ping.
-                        # Remove and record occurrence.
-                        should_keep = False
-                        condition_counts['nested'][device_id] += 1
-                    else:
-                        overlap_ms = last_stop - current_ping[0]
-                        if overlap_ms < overlap_tolerance:
-                            # Overlap is negligible (within tolerance).
-                            # Keep ping but record occurrence.
-                            condition_counts['negligibleoverlap'][device_id] += 1
-                        else:
-                            # Otherwise, overlap is non-trivial.
-                            # Keep curent ping but record occurrence.
-                            condition_counts['overlap'][device_id] += 1
-            if should_keep:
-                pings_to_keep.append(current_ping)
-        if pings_to_keep:
-            # Update list of pings by device with new sanitized list.
-            pings_by_device[device_id] = pings_to_keep
+    if vectorized:
+        info = tables['info']
+        pings_by_device, counts = timeline_utils.classify_devices(
+            [row[0] for row in info], 
+            [row[1] for row in info], 
+            [row[2] for row in info])
+        for condition, device_counts in counts.iteritems():
+            condition_counts[condition].update(device_counts)
+        return pings_by_device, is_dogfood_device, condition_counts
+    
+    for device_id, timeline in pings_by_device.iteritems():
+        for condition, n in timeline.classify().iteritems():
+            condition_counts[condition][device_id] += n
     
-    # Print statistics about overlaps.
+    return pings_by_device, is_dogfood_device, condition_counts
+
+
+def print_overlap_stats(condition_counts, is_dogfood_device):
+    """Print statistics about overlaps."""
     if condition_counts:
         print('\nOverlaps:')
         if 'clockskew' in condition_counts:
@@ -258,10 +315,28 @@ def main(job_output, csv_dir):
                 (sum(count_map.values()), 
                 len(count_map), 
                 addendum))
+
+
+def summarize_dogfood(tables, pings_by_device, is_dogfood_device, 
+        processes = None, vectorized = None):
+    """Aggregate device info and app usage data for foxfood devices.
+    
+    Only pings retained by classify_pings() are included. Returns mappings of 
+    device IDs to device details and to app usage by (app URL, date).
     
-    # Aggregate data for foxfood devices and report.
-    # ----------------------------------------------
+    Devices are summarized independently, so they are partitioned by device 
+    ID across a pool of the given number of processes (by default, 
+    summary_processes), and the results are merged. Fewer processes are used
+    if there are less than min_devices_per_process devices for each, and no
+    pool is started if this leaves a single process.
     
+    If vectorized is True, app usage is instead aggregated for all devices 
+    together from the column table of app rows using NumPy. By default, this 
+    is done if NumPy is available and the app table is a column table.
+    """
+    if vectorized is None:
+        vectorized = (summary_utils.np is not None and 
+            isinstance(tables['app'], ColumnTable))
     dogfood_info = defaultdict(list)
     dogfood_app = defaultdict(list)
     for row in tables['info']:
@@ -275,113 +350,166 @@ def main(job_output, csv_dir):
             # Not for app rows though - have to do this step for those.
             # Drop deviceID from the beginning and dogfood flag from the end.
             dogfood_info[device_id].append(row[1:-1])
-    for row in tables['app']:
-        device_id = row[0]
-        if (is_dogfood_device[device_id] and 
-                    (row[1], row[2]) in pings_by_device[device_id]):
-            # Drop deviceID from the beginning and dogfood flag from the end.
-            dogfood_app[device_id].append(row[1:-1])
+    dogfood_appusage = None
+    if vectorized:
+        rows = select_dogfood_rows(tables['app'], pings_by_device, 
+            is_dogfood_device)
+        if rows is not None:
+            dogfood_appusage = summary_utils.aggregate_app_table(
+                tables['app'], rows)
+    if dogfood_appusage is None:
+        for row in tables['app']:
+            device_id = row[0]
+            if (is_dogfood_device[device_id] and 
+                        (row[1], row[2]) in pings_by_device[device_id]):
+                # Drop deviceID from the beginning and dogfood flag from the
+                # end.
+                dogfood_app[device_id].append(row[1:-1])
     
-    # Summparize device info and app usage for each dogfooding device.
-    dogfood_details = {}
-    for device_id, payloads in dogfood_info.iteritems():
-        device_details = {}
-        # Sort by all fields, which sorts first by start then by stop times 
-        # (ie chronologically), and then by values of other fields.
-        payloads.sort()
-        # Extract the actual device info fields, from 'os' to 
-        # 'developer.menu.enabled' in au_device_info_keys
-        get_device_info = lambda r: r[5:]
-        # List of unique collections of device info fields with start
-        # timestamp.
-        deviceinfo = [(payloads[0][0], get_device_info(payloads[0]))]
-        for i in range(1, len(payloads)):
-            newinfo = get_device_info(payloads[i])
-            if newinfo != deviceinfo[-1][1]:
-                deviceinfo.append((payloads[i][0], newinfo))
-        # Store full latest device info.
-        device_details['info'] = deviceinfo[-1][1]
-        # Earliest and latest measurement ranges.
-        device_details['earliest_start'] = payloads[0][0]
-        device_details['latest_stop'] = payloads[-1][1]
-        # Earliest and latest ping submission dates.
-        submission_dates = [p[2] for p in payloads]
-        device_details['earliest_submission'] = min(submission_dates)
-        device_details['latest_submission'] = max(submission_dates)
-        device_details['num_pings'] = len(payloads)
-        device_details['changed_info'] = len(deviceinfo) > 1
-        device_details['earliest_appusage'] = ''
-        device_details['latest_appusage'] = ''
-        dogfood_details[device_id] = device_details
-    
-    dogfood_appusage = {}
-    for device_id, payloads in dogfood_app.iteritems():
-        app_data = {}
-        for p in payloads:
-            # App rows are identified by app URL and usage date.
-            app_key = (p[2], p[3])
-            if app_key not in app_data:
-                # Add a new record.
-                # Store values in a dict for convenient aggregation, and 
-                # convert to strings at the end.
-                app_data[app_key] = {
-                    'counts': [0, 0, 0, 0, 0, 0],
-                    # Maintain set of unique addon flag values seen for this app
-                    # and date. Should be either empty or a single value.
-                    'addon_flag': set(),
-                    # Maintain a mapping of activity identifiers to counts.
-                    'activities': defaultdict(lambda: 0)
-                }
-            for i in range(6):
-                # Add in new numerical values.
-                if p[4+i]:
-                    app_data[app_key]['counts'][i] += p[4+i]
-            if p[10] != '':
-                app_data[app_key]['addon_flag'].add(p[10])
-            if p[11]:
-                # If we have activity counts, increment.
-                current_activities = p[11].split(';')
-                for curr_act in current_activities:
-                    curr_act = curr_act.rsplit(':', 1)
-                    app_data[app_key]['activities'][curr_act[0]] += (
-                        int(curr_act[1]))
-        # Convert app data values to strings.
-        for app_key in app_data:
-            app_data_values = [str(v) for v in app_data[app_key]['counts']]
-            app_data_values.append(';'.join(
-                [str(v) for v in sorted(app_data[app_key]['addon_flag'])]))
-            app_data_values.append(';'.join(sorted(['%s:%s' % x
-                for x in app_data[app_key]['activities'].iteritems()])))
-            app_data[app_key] = app_data_values
-        dogfood_appusage[device_id] = app_data
-        # Add app usage dates summary to dogfood_details.
-        usage_dates = [k[1] for k in app_data]
-        dogfood_details[device_id]['earliest_appusage'] = min(usage_dates)
-        dogfood_details[device_id]['latest_appusage'] = max(usage_dates)
+    if processes is None:
+        processes = summary_processes
+    processes = min(processes, len(dogfood_info) // min_devices_per_process)
+    if processes <= 1:
+        dogfood_details, appusage = summarize_devices((dogfood_info, 
+            dogfood_app))
+    else:
+        partitions = [({}, {}) for i in range(processes)]
+        for device_id, payloads in dogfood_info.iteritems():
+            partitions[device_partition(device_id, processes)][0][
+                device_id] = payloads
+        for device_id, payloads in dogfood_app.iteritems():
+            partitions[device_partition(device_id, processes)][1][
+                device_id] = payloads
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(summarize_devices, partitions)
+        finally:
+            pool.close()
+            pool.join()
+        dogfood_details = {}
+        appusage = {}
+        for details, partition_appusage in results:
+            dogfood_details.update(details)
+            appusage.update(partition_appusage)
+    if dogfood_appusage is None:
+        return dogfood_details, appusage
+    summary_utils.add_app_usage_dates(dogfood_details, dogfood_appusage)
+    return dogfood_details, dogfood_appusage
+
+
+def select_dogfood_rows(table, pings_by_device, is_dogfood_device):
+    """Find the rows of a column table of app rows belonging to retained 
+    pings from foxfood devices.
     
+    Returns a NumPy array of the row indices, or None if the start or stop 
+    columns hold values other than integers.
+    """
+    np = summary_utils.np
+    devices, device_ids = table.codes('deviceID')
+    starts, start_encoding = table.codes('start')
+    stops, stop_encoding = table.codes('stop')
+    if start_encoding is not None or stop_encoding is not None:
+        return None
+    if not len(table):
+        return np.array([], dtype=np.int64)
+    device_ids = device_ids.values
+    as_array = lambda a: np.frombuffer(a, dtype='i%s' % a.itemsize)
+    devices = as_array(devices)
+    # Check retained pings only for rows from foxfood devices.
+    is_dogfood = np.array([bool(is_dogfood_device.get(device_id)) 
+        for device_id in device_ids], dtype=bool)
+    candidates = np.flatnonzero(is_dogfood[devices])
+    rows = []
+    for i, device, start, stop in zip(candidates.tolist(), 
+            devices[candidates].tolist(), 
+            as_array(starts)[candidates].tolist(),
+            as_array(stops)[candidates].tolist()):
+        if (start, stop) in pings_by_device[device_ids[device]]:
+            rows.append(i)
+    return np.array(rows, dtype=np.int64)
+
+
+def device_partition(device_id, n):
+    """Assign a device ID to one of n partitions by hashing."""
+    if isinstance(device_id, unicode):
+        device_id = device_id.encode('utf-8')
+    return zlib.crc32(device_id) % n
+
+
+def write_dogfood_tables(dogfood_details, dogfood_appusage, csv_dir):
+    """Write output CSVs of aggregated foxfood device data."""
     with open(os.path.join(csv_dir, dogfood_details_csv), 'w') as outfile:
         writer = csv.writer(outfile)
         writer.writerow(schema.au_dogfood_details_csv)
         for device_id, vals in dogfood_details.iteritems():
-            row = [device_id]
-            row += [vals[k] for k in schema.au_dogfood_details_csv[1:9]]
-            row += vals['info']
-            util.write_unicode_row(writer, row)
+            util.write_unicode_row(writer, 
+                dogfood_details_row(device_id, vals))
     print('\nWrote dogfood details CSV: %s rows' % len(dogfood_details))
+    history_rows = 0
+    with open(os.path.join(csv_dir, dogfood_history_csv), 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(schema.au_dogfood_history_csv)
+        for device_id, vals in dogfood_details.iteritems():
+            rows = dogfood_history_rows(device_id, vals)
+            for row in rows:
+                util.write_unicode_row(writer, row)
+            history_rows += len(rows)
+    print('Wrote dogfood history CSV: %s rows' % history_rows)
     with open(os.path.join(csv_dir, dogfood_appusage_csv), 'w') as outfile:
         writer = csv.writer(outfile)
         writer.writerow(schema.au_dogfood_appusage_csv)
         for device_id, app_rows in dogfood_appusage.iteritems():
-            for app_key, vals in app_rows.iteritems():
-                row = [device_id] + list(app_key) + vals
+            for row in dogfood_appusage_rows(device_id, app_rows):
                 util.write_unicode_row(writer, row)
     print('Wrote dogfood details CSV: %s rows' % 
         sum(map(len, dogfood_appusage.values())))
 
 
+def main(job_output, csv_dir, foxfood_dir = None):
+    """Load map-reduce output and split records into tables.
+    
+    Count duplicates and write relevant subsets to CSVs.
+    
+    Data from the raw payloads are split into three groups that are each
+    recorded in a separate table: 
+    - top-level device/OS info ("info")
+    - daily app usage ("app")
+    - daily search counts ("search")
+    These are recorded per payload, which are identified using (deviceID,
+    start time, stop time).
+    
+    Next, the payloads from foxfood devices are joined by device, 
+    and aggregate top-level info and daily app usage data are reported 
+    separately.
+    
+    Some diagnostics are also reported around joining pings from the same
+    device. Ideally the start-to-stop time periods should be sequential with
+    negligible overlap, although this is not always the case.
+    
+    If a foxfood dir is given, inactive foxfooders are then reported from the
+    foxfood device details.
+    
+    Currently fields in the key and value are referred to by positional index,
+    which is quick but non-transparent and non-robust. The ordering for the 
+    fields are determined by the 'au_{...}_{...}_keys' lists in 
+    ../utils/dump_schema.py.
+    """
+    output, tables, duplicate_counts, multiple_info = load_tables(job_output)
+    print_job_stats(output, duplicate_counts, multiple_info)
+    write_tables(tables, csv_dir)
+    pings_by_device, is_dogfood_device, condition_counts = classify_pings(
+        tables)
+    print_overlap_stats(condition_counts, is_dogfood_device)
+    dogfood_details, dogfood_appusage = summarize_dogfood(tables, 
+        pings_by_device, is_dogfood_device)
+    write_dogfood_tables(dogfood_details, dogfood_appusage, csv_dir)
+    if foxfood_dir is not None:
+        foxfood_report.write_report(dogfood_details, foxfood_dir)
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         sys.exit(2)
-    main(*sys.argv[1:3])
+    main(*sys.argv[1:4])
     sys.exit(0)
 
@@ -0,0 +1,90 @@
+"""
+Convert the output of the AU job keyed by device
+(awsjobs/dump_format_appusage_bydevice.py) to CSV.
+
+The job output already contains the deduplicated info, app and search rows,
+the ping conditions for each device, and the foxfood summaries, so these are
+written to the same CSVs as au_data_tables.py in a single streaming pass, and
+the same statistics are printed.
+
+The script expects the following command-line args:
+- the path to the map-reduce output file, which is the input to this script
+- the dir path to contain the output CSVs.
+"""
+
+import sys
+import csv
+import os.path
+from collections import defaultdict
+
+import utils.dump_schema as schema
+from utils.device_timeline import ping_conditions
+import output_utils as util
+import au_data_tables as au
+
+# Output CSVs for each type of row in the job output.
+table_csvs = [
+    ('info', au.info_csv, schema.au_info_csv),
+    ('app', au.app_csv, schema.au_app_csv),
+    ('search', au.search_csv, schema.au_search_csv),
+    ('dogfood_details', au.dogfood_details_csv,
+        schema.au_dogfood_details_csv),
+    ('dogfood_history', au.dogfood_history_csv,
+        schema.au_dogfood_history_csv),
+    ('dogfood_appusage', au.dogfood_appusage_csv,
+        schema.au_dogfood_appusage_csv)
+]
+
+
+def main(job_output, csv_dir):
+    """Write the rows in the map-reduce output to CSVs, and print stats."""
+    output = {'counters': {}, 'conditions': {}}
+    duplicate_counts = defaultdict(lambda: defaultdict(int))
+    multiple_info = []
+    condition_counts = defaultdict(lambda: defaultdict(int))
+    is_dogfood_device = {}
+    inconsistent_dogfooding_flag = 0
+    row_counts = defaultdict(int)
+    
+    files = []
+    writers = {}
+    for name, filename, headers in table_csvs:
+        outfile = open(os.path.join(csv_dir, filename), 'w')
+        files.append(outfile)
+        writers[name] = csv.writer(outfile)
+        writers[name].writerow(headers)
+    for type, row in au.iter_table_rows(job_output, output, duplicate_counts,
+            multiple_info):
+        if type in writers:
+            util.write_unicode_row(writers[type], au.format_row(type, row))
+            row_counts[type] += 1
+        elif type == 'conditions':
+            device_id = row[0]
+            is_dogfood_device[device_id] = row[1]
+            inconsistent_dogfooding_flag += row[2]
+            for condition, n in zip(ping_conditions, row[3:]):
+                if n:
+                    condition_counts[condition][device_id] += n
+    for outfile in files:
+        outfile.close()
+    
+    au.print_job_stats(output, duplicate_counts, multiple_info)
+    print('\nWrote info CSV: %s rows' % row_counts['info'])
+    print('Wrote app CSV: %s rows' % row_counts['app'])
+    print('Wrote search CSV: %s rows' % row_counts['search'])
+    if inconsistent_dogfooding_flag:
+        print('\nThere were inconsistent dogfooding flags')
+    au.print_overlap_stats(condition_counts, is_dogfood_device)
+    print('\nWrote dogfood details CSV: %s rows' %
+        row_counts['dogfood_details'])
+    print('Wrote dogfood history CSV: %s rows' % 
+        row_counts['dogfood_history'])
+    print('Wrote dogfood details CSV: %s rows' %
+        row_counts['dogfood_appusage'])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(2)
+    main(*sys.argv[1:3])
+    sys.exit(0)
@@ -0,0 +1,228 @@
+"""
+Load the AU data outputted by the map-reduce job and convert to CSV, as in
+au_data_tables.py, without holding the full dataset in memory.
+
+The rows of the info, app and search tables are parsed from the job output
+and written to temporary run files in chunks, each sorted by (deviceID,
+start, stop). The runs are then merged, and the rows for each device are
+processed together: they are written to the output CSVs, the device's pings
+are classified for overlap, and the foxfood summaries are generated if it is
+a foxfood device. Memory use is bounded by the size of a chunk and the rows
+for the largest single device.
+
+The output CSVs are the same as those written by au_data_tables.py, except
+that rows are ordered by device.
+
+The script expects the following command-line args:
+- the path to the map-reduce output file, which is the input to this script
+- the dir path to contain the output CSVs
+- optionally, the dir path to create temporary run files in.
+"""
+
+import sys
+import csv
+import heapq
+import marshal
+import shutil
+import tempfile
+import os
+import os.path
+from itertools import groupby
+from collections import defaultdict
+
+import utils.dump_schema as schema
+from utils.dogfood_summary import summarize_device
+import output_utils as util
+import au_data_tables as au
+
+# Maximum number of rows to sort in memory at a time.
+run_size = 500000
+
+# Output CSVs for the AU tables.
+table_csvs = [
+    ('info', au.info_csv, schema.au_info_csv),
+    ('app', au.app_csv, schema.au_app_csv),
+    ('search', au.search_csv, schema.au_search_csv)
+]
+
+
+def write_run(items, tmp_dir):
+    """Sort a chunk of items and write them to a temporary run file.
+    
+    Returns the path to the run file.
+    """
+    items.sort()
+    fd, path = tempfile.mkstemp(suffix='.run', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as outfile:
+        for item in items:
+            marshal.dump(item, outfile)
+    return path
+
+
+def read_run(path):
+    """Iterate over the items in a run file in order."""
+    with open(path, 'rb') as infile:
+        while True:
+            try:
+                yield marshal.load(infile)
+            except EOFError:
+                return
+
+
+def sort_rows(job_output, tmp_dir, output, duplicate_counts, multiple_info):
+    """Split the rows of the AU tables in the job output into sorted runs.
+    
+    Each row is stored as an item (deviceID, start, stop, seq, table name,
+    row), where seq is a sequence number which keeps the items unique.
+    Returns the list of run file paths.
+    """
+    runs = []
+    items = []
+    rows = au.iter_table_rows(job_output, output, duplicate_counts,
+        multiple_info)
+    for seq, (type, row) in enumerate(rows):
+        if type not in ('info', 'app', 'search'):
+            continue
+        items.append((row[0], row[1], row[2], seq, type, row))
+        if len(items) >= run_size:
+            runs.append(write_run(items, tmp_dir))
+            items = []
+    if items:
+        runs.append(write_run(items, tmp_dir))
+    return runs
+
+
+def iter_devices(runs):
+    """Merge the sorted runs, and iterate over the rows for each device.
+    
+    Yields pairs of device ID and a dict mapping table names to lists of
+    rows, ordered by (start, stop). The run files are closed once iteration
+    finishes or the iterator is closed.
+    """
+    readers = [read_run(path) for path in runs]
+    try:
+        merged = heapq.merge(*readers)
+        for device_id, items in groupby(merged, lambda item: item[0]):
+            tables = defaultdict(list)
+            for item in items:
+                tables[item[4]].append(item[5])
+            yield device_id, tables
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def process_device(device_id, tables, condition_counts, is_dogfood_device):
+    """Classify the pings for a device, and summarize foxfood devices.
+    
+    Conditions found for the device's pings are added to condition_counts,
+    and the device's dogfooding flag is recorded in is_dogfood_device if any
+    conditions were found. 
+    
+    Returns the device details and app usage as computed by 
+    summarize_devices() (or None if it is not a foxfood device), and the 
+    number of info rows whose dogfooding flag was inconsistent with the first.
+    """
+    if not tables['info']:
+        return None, 0
+    counts, is_dogfood, inconsistent, summary = summarize_device(device_id,
+        tables['info'], tables['app'])
+    for condition, n in counts.iteritems():
+        condition_counts[condition][device_id] += n
+    if counts:
+        is_dogfood_device[device_id] = is_dogfood
+    return summary, inconsistent
+
+
+def main(job_output, csv_dir, tmp_dir = None):
+    """Load map-reduce output, sort rows by device out of core, and write the
+    AU tables and foxfood summaries to CSVs.
+    
+    The temporary run files are removed and the output CSVs are closed 
+    whether or not this succeeds. If it fails, the partially written CSVs are
+    removed.
+    """
+    output = {'counters': {}, 'conditions': {}}
+    duplicate_counts = defaultdict(lambda: defaultdict(int))
+    multiple_info = []
+    files = []
+    devices = None
+    run_dir = tempfile.mkdtemp(prefix='au_runs_', dir=tmp_dir)
+    try:
+        runs = sort_rows(job_output, run_dir, output, duplicate_counts,
+            multiple_info)
+        au.print_job_stats(output, duplicate_counts, multiple_info)
+        
+        writers = {}
+        for name, filename, headers in table_csvs + [
+                ('dogfood_details', au.dogfood_details_csv,
+                    schema.au_dogfood_details_csv),
+                ('dogfood_history', au.dogfood_history_csv,
+                    schema.au_dogfood_history_csv),
+                ('dogfood_appusage', au.dogfood_appusage_csv,
+                    schema.au_dogfood_appusage_csv)]:
+            outfile = open(os.path.join(csv_dir, filename), 'w')
+            files.append(outfile)
+            writers[name] = csv.writer(outfile)
+            writers[name].writerow(headers)
+        
+        row_counts = defaultdict(int)
+        condition_counts = defaultdict(lambda: defaultdict(int))
+        is_dogfood_device = {}
+        inconsistent_dogfooding_flag = 0
+        devices = iter_devices(runs)
+        for device_id, tables in devices:
+            for name, filename, headers in table_csvs:
+                for row in tables[name]:
+                    util.write_unicode_row(writers[name],
+                        au.format_row(name, row))
+                row_counts[name] += len(tables[name])
+            summary, inconsistent = process_device(device_id, tables,
+                condition_counts, is_dogfood_device)
+            inconsistent_dogfooding_flag += inconsistent
+            if summary is None:
+                continue
+            details, appusage = summary
+            util.write_unicode_row(writers['dogfood_details'],
+                au.dogfood_details_row(device_id, details[device_id]))
+            row_counts['dogfood_details'] += 1
+            for row in au.dogfood_history_rows(device_id, 
+                    details[device_id]):
+                util.write_unicode_row(writers['dogfood_history'], row)
+                row_counts['dogfood_history'] += 1
+            if device_id in appusage:
+                for row in au.dogfood_appusage_rows(device_id,
+                        appusage[device_id]):
+                    util.write_unicode_row(writers['dogfood_appusage'], row)
+                row_counts['dogfood_appusage'] += len(appusage[device_id])
+    except Exception:
+        for outfile in files:
+            outfile.close()
+            os.remove(outfile.name)
+        raise
+    finally:
+        for outfile in files:
+            outfile.close()
+        if devices is not None:
+            devices.close()
+        shutil.rmtree(run_dir)
+    
+    print('\nWrote info CSV: %s rows' % row_counts['info'])
+    print('Wrote app CSV: %s rows' % row_counts['app'])
+    print('Wrote search CSV: %s rows' % row_counts['search'])
+    if inconsistent_dogfooding_flag:
+        print('\nThere were inconsistent dogfooding flags')
+    au.print_overlap_stats(condition_counts, is_dogfood_device)
+    print('\nWrote dogfood details CSV: %s rows' %
+        row_counts['dogfood_details'])
+    print('Wrote dogfood history CSV: %s rows' % 
+        row_counts['dogfood_history'])
+    print('Wrote dogfood details CSV: %s rows' %
+        row_counts['dogfood_appusage'])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(2)
+    main(*sys.argv[1:4])
+    sys.exit(0)
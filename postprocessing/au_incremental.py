@@ -0,0 +1,407 @@
+"""
+Incrementally update the AU tables from the output of a map-reduce job 
+covering only the most recent submission dates.
+
+A persistent SQLite store records the identifier (deviceID, start, stop) of 
+every payload seen so far, together with its earliest submission date and a
+hash of its info fields, as well as hashes of its app and search rows. 
+Payloads in the new job output are merged against the store, and only rows 
+not seen before are appended to the info, app and search CSVs. This matches 
+the deduplication in the reducer of awsjobs/dump_format_appusage.py:
+- resubmissions of a known payload are dropped, keeping the earliest 
+  submission date in the store
+- any app and search rows not previously seen for a known payload are kept
+- resubmissions whose info fields differ (other than by submission date) are
+  reported as having multiple unique info records, and skipped.
+Rows for a payload that has already been written are not changed 
+retroactively, except that the info CSV is rewritten with the earlier 
+submission date when a resubmission predates the one recorded.
+
+The updates to the store are committed in a single transaction, after the 
+updated CSVs have been written to temporary files and moved into place, so 
+that payloads are never recorded in the store without their rows having been
+written. If the run is interrupted before the CSVs are moved into place, the 
+store and CSVs are left unchanged. If it is interrupted while they are being 
+moved, some new rows can be appended again on the next run, but none are 
+lost.
+
+If the job output does not reach back to the day after the latest submission
+date in the store (eg. because a run was missed), the update fails without
+changing the store or the CSVs. The missing dates can be filled in by running
+on the output of a job covering them.
+
+After merging, a Bloom filter of all payload identifiers in the store can be
+written, to be downloaded by the next AU job. The job then skips app and 
+search rows for payloads found in the filter, emitting a 'seen' marker with 
+the numbers of rows skipped instead. These are checked against the rows in 
+the store. A payload with fewer rows stored than were skipped, either 
+because it was a false positive in the filter or because a resubmission 
+carried more data, is reported and recorded as incomplete in the store. 
+Incomplete payloads are left out of the next filter, so that their rows are 
+picked up when the next job covers them again (the incremental job overlaps 
+with the previous run), at which point they are no longer incomplete.
+
+The foxfood summaries are then regenerated from the full info and app CSVs,
+as in au_data_tables.py.
+
+The script expects the following command-line args:
+- the path to the map-reduce output file, which is the input to this script
+- the path to the SQLite store file (created if it does not exist)
+- the dir path containing the output CSVs
+- optionally, the path to write the filter of seen payloads to
+- optionally, the foxfood dir path containing the list of foxfood IMEIs, to
+  write the inactive foxfooder report to (see inactive_foxfooders.py).
+"""
+
+import sys
+import csv
+import shutil
+import hashlib
+import sqlite3
+import os
+import os.path
+from collections import defaultdict
+
+import utils.dump_schema as schema
+import utils.date_window as window
+import utils.bloom as bloom
+from utils.payload_utils import payload_id_string
+import output_utils as util
+import au_data_tables as au
+import inactive_foxfooders as foxfood_report
+
+# False positive rate for the filter of seen payloads.
+seen_filter_fp_rate = 0.0001
+
+table_csvs = [
+    ('info', au.info_csv, schema.au_info_csv),
+    ('app', au.app_csv, schema.au_app_csv),
+    ('search', au.search_csv, schema.au_search_csv)
+]
+
+
+def open_store(store_path):
+    """Open the payload identity store, creating it if necessary."""
+    conn = sqlite3.connect(store_path)
+    conn.execute('''CREATE TABLE IF NOT EXISTS payloads (
+        deviceID TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        stop INTEGER NOT NULL,
+        submission_date TEXT NOT NULL,
+        info_hash TEXT NOT NULL,
+        PRIMARY KEY (deviceID, start, stop))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS payload_rows (
+        deviceID TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        stop INTEGER NOT NULL,
+        row_hash TEXT NOT NULL,
+        PRIMARY KEY (deviceID, start, stop, row_hash))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS incomplete_payloads (
+        deviceID TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        stop INTEGER NOT NULL,
+        PRIMARY KEY (deviceID, start, stop))''')
+    return conn
+
+
+def info_hash(row):
+    """Hash the fields of an info row other than the payload identifier and
+    submission date.
+    """
+    return hashlib.md5(repr(tuple(row[4:]))).hexdigest()
+
+
+def row_hash(name, row):
+    """Hash an app or search row, including the table name.
+    
+    The row is hashed as its values would be written to CSV, with the app
+    activities sorted, so that rows read back from the CSV hash the same as
+    rows from the job output, whatever the order of their activities.
+    """
+    values = [util.encode_for_csv(v) for v in row]
+    if name == 'app':
+        i = au.app_activities_index
+        values[i] = ';'.join(sorted(values[i].split(';')))
+    return hashlib.md5(repr((name,) + tuple(values))).hexdigest()
+
+
+def merge_payloads(conn, info_rows):
+    """Merge info rows from the new job output against the store.
+    
+    New payloads are added to the store. Returns the set of identifiers of 
+    new payloads, the set of identifiers of previously seen payloads with
+    consistent info, a dict mapping previously seen payloads to earlier 
+    submission dates found for them, and a dict of counts of duplicate 
+    conditions. Info rows conflicting with a previously seen payload are 
+    printed.
+    """
+    new_payloads = set()
+    seen_payloads = set()
+    earlier_dates = {}
+    counts = defaultdict(int)
+    conflicts = []
+    for row in info_rows:
+        payload_id = tuple(row[:3])
+        stored = conn.execute('''SELECT submission_date, info_hash 
+            FROM payloads WHERE deviceID = ? AND start = ? AND stop = ?''',
+            payload_id).fetchone()
+        h = info_hash(row)
+        if stored is None:
+            conn.execute('INSERT INTO payloads VALUES (?, ?, ?, ?, ?)', 
+                payload_id + (row[3], h))
+            new_payloads.add(payload_id)
+            continue
+        counts['duplicate'] += 1
+        if stored[1] != h:
+            conflicts.append(row)
+            continue
+        seen_payloads.add(payload_id)
+        if row[3] < stored[0]:
+            # Keep the earliest submission date.
+            conn.execute('''UPDATE payloads SET submission_date = ?
+                WHERE deviceID = ? AND start = ? AND stop = ?''', 
+                (row[3],) + payload_id)
+            earlier_dates[payload_id] = row[3]
+            counts['earlier'] += 1
+    if conflicts:
+        print('\nSome payloads had multiple unique info records:')
+        for r in conflicts:
+            print(r)
+    return new_payloads, seen_payloads, earlier_dates, counts
+
+
+def check_missing_dates(conn, info_rows):
+    """Raise an error if the new info rows do not reach back to the day after
+    the latest submission date in the store.
+    """
+    latest = conn.execute(
+        'SELECT MAX(submission_date) FROM payloads').fetchone()[0]
+    new_dates = set([r[3] for r in info_rows if r[3]])
+    missing = window.missing_dates([latest] if latest else [], new_dates)
+    if missing:
+        raise ValueError('Job output starts at %s, but the store only covers '
+            'dates up to %s. Rerun on the output of a job covering the %s '
+            'missing dates.' % (min(new_dates), latest, len(missing)))
+
+
+def update_submission_dates(path, outfile, earlier_dates):
+    """Copy the info CSV to outfile, replacing the submission dates of 
+    previously seen payloads with the earlier dates found for them.
+    """
+    earlier_dates = dict((tuple([util.encode_for_csv(v) for v in k]), 
+        util.encode_for_csv(d)) for k, d in earlier_dates.iteritems())
+    date_index = schema.au_info_csv.index('submission_date')
+    n = 0
+    with open(path) as infile:
+        reader = csv.reader(infile)
+        writer = csv.writer(outfile)
+        writer.writerow(next(reader))
+        for row in reader:
+            d = earlier_dates.get(tuple(row[:3]))
+            if d is not None and d < row[date_index]:
+                row[date_index] = d
+                n += 1
+            writer.writerow(row)
+    print('Updated submission dates for %s rows in info CSV' % n)
+
+
+def stage_csv(csv_dir, filename, headers, earlier_dates = None):
+    """Copy an output CSV to a temporary file alongside it, to which new rows
+    are appended, and return the path of the copy.
+    
+    For the info CSV, earlier_dates gives the earlier submission dates found
+    for previously seen payloads, which are updated in the copy. If the CSV 
+    does not exist yet, the copy just has the headers.
+    """
+    path = os.path.join(csv_dir, filename)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as outfile:
+        if not os.path.exists(path):
+            csv.writer(outfile).writerow(headers)
+        elif earlier_dates:
+            update_submission_dates(path, outfile, earlier_dates)
+        else:
+            with open(path) as infile:
+                shutil.copyfileobj(infile, outfile)
+    return tmp_path
+
+
+def append_tables(conn, tables, new_payloads, seen_payloads, staged):
+    """Append the rows for new payloads to the staged copies of the info, app
+    and search CSVs, given as a dict mapping table names to paths.
+    
+    App and search rows are also appended for previously seen payloads if 
+    they are not already in the store.
+    """
+    for name, filename, headers in table_csvs:
+        n = 0
+        with open(staged[name], 'a') as outfile:
+            writer = csv.writer(outfile)
+            for r in tables[name]:
+                r = au.format_row(name, r)
+                payload_id = tuple(r[:3])
+                if name == 'info':
+                    if payload_id not in new_payloads:
+                        continue
+                elif payload_id in new_payloads or payload_id in seen_payloads:
+                    inserted = conn.execute('''INSERT OR IGNORE INTO 
+                        payload_rows VALUES (?, ?, ?, ?)''', 
+                        payload_id + (row_hash(name, r),)).rowcount
+                    if not inserted:
+                        continue
+                else:
+                    continue
+                util.write_unicode_row(writer, r)
+                n += 1
+        print('Appended %s rows to %s CSV' % (n, name))
+
+
+def check_seen_markers(conn, seen_rows, new_payloads):
+    """Check the payloads whose app and search rows were skipped in the job
+    because they were found in the filter of seen payloads.
+    
+    Payloads with fewer rows in the store than were skipped are missing rows,
+    and are recorded as incomplete. These include any payloads not previously
+    in the store, which were false positives. 
+    """
+    if not seen_rows:
+        return
+    print('\n%s previously seen payloads had app and search rows skipped' % 
+        len(seen_rows))
+    incomplete = []
+    for r in seen_rows:
+        payload_id = tuple(r[:3])
+        nrows = conn.execute('''SELECT COUNT(*) FROM payload_rows 
+            WHERE deviceID = ? AND start = ? AND stop = ?''', 
+            payload_id).fetchone()[0]
+        if nrows < r[3] + r[4]:
+            incomplete.append(r)
+            conn.execute('''INSERT OR IGNORE INTO incomplete_payloads 
+                VALUES (?, ?, ?)''', payload_id)
+    if incomplete:
+        false_positives = [r for r in incomplete 
+            if tuple(r[:3]) in new_payloads]
+        print(('%s payloads are missing rows (%s new payloads skipped as ' +
+            'false positives), out of %s app and %s search rows skipped. ' +
+            'These will be left out of the next filter:') % 
+                (len(incomplete), len(false_positives),
+                sum([r[3] for r in incomplete]), 
+                sum([r[4] for r in incomplete])))
+        for r in incomplete:
+            print('\t%s' % payload_id_string(r[:3]))
+
+
+def clear_incomplete(conn, seen_payloads, seen_rows):
+    """Unmark incomplete payloads whose rows were included in the job output,
+    having been left out of the filter.
+    """
+    skipped = set([tuple(r[:3]) for r in seen_rows])
+    n = 0
+    for payload_id in seen_payloads:
+        if payload_id not in skipped:
+            n += conn.execute('''DELETE FROM incomplete_payloads 
+                WHERE deviceID = ? AND start = ? AND stop = ?''', 
+                payload_id).rowcount
+    if n:
+        print('%s previously incomplete payloads were filled in' % n)
+
+
+def write_seen_filter(conn, filter_path):
+    """Write a Bloom filter containing all payload identifiers in the store,
+    other than those of incomplete payloads.
+    """
+    complete = '''FROM payloads p WHERE NOT EXISTS (
+        SELECT 1 FROM incomplete_payloads i WHERE i.deviceID = p.deviceID 
+            AND i.start = p.start AND i.stop = p.stop)'''
+    n = conn.execute('SELECT COUNT(*) ' + complete).fetchone()[0]
+    bf = bloom.new_filter(n, seen_filter_fp_rate)
+    for payload_id in conn.execute('SELECT deviceID, start, stop ' + 
+            complete):
+        bloom.add(bf, payload_id_string(payload_id))
+    bloom.save(bf, filter_path)
+    print('Wrote filter of %s seen payloads: %s bytes' % (n, len(bf['bits'])))
+
+
+def parse_csv_value(val):
+    """Convert a value read back from an AU CSV to its original type."""
+    if val == 'True':
+        return True
+    if val == 'False':
+        return False
+    return val.decode('utf-8')
+
+
+def read_table(csv_dir, filename, numeric_columns):
+    """Read an AU table back from CSV, restoring integer columns."""
+    rows = []
+    with open(os.path.join(csv_dir, filename)) as infile:
+        reader = csv.reader(infile)
+        next(reader)
+        for row in reader:
+            row = [parse_csv_value(v) for v in row]
+            for i in numeric_columns:
+                if row[i] != '':
+                    row[i] = int(row[i])
+            rows.append(row)
+    return rows
+
+
+def main(job_output, store_path, csv_dir, filter_path = None, 
+        foxfood_dir = None):
+    """Merge new map-reduce output into the AU tables and regenerate the 
+    foxfood summaries.
+    
+    If filter_path is given, the filter of seen payloads is written there. 
+    If foxfood_dir is given, inactive foxfooders are reported there.
+    """
+    output, tables, duplicate_counts, multiple_info = au.load_tables(
+        job_output)
+    au.print_job_stats(output, duplicate_counts, multiple_info)
+    
+    conn = open_store(store_path)
+    check_missing_dates(conn, tables['info'])
+    new_payloads, seen_payloads, earlier_dates, counts = merge_payloads(conn, 
+        tables['info'])
+    print(('\n%s new payloads; %s previously seen payloads were dropped ' +
+        '(%s with an earlier submission date)') % 
+        (len(new_payloads), counts['duplicate'], counts['earlier']))
+    staged = {}
+    for name, filename, headers in table_csvs:
+        staged[name] = stage_csv(csv_dir, filename, headers, 
+            earlier_dates if name == 'info' else None)
+    append_tables(conn, tables, new_payloads, seen_payloads, staged)
+    check_seen_markers(conn, tables['seen'], new_payloads)
+    clear_incomplete(conn, seen_payloads, tables['seen'])
+    # Only record the new payloads in the store once the updated CSVs are in 
+    # place.
+    for name, filename, headers in table_csvs:
+        os.rename(staged[name], os.path.join(csv_dir, filename))
+    conn.commit()
+    if filter_path is not None:
+        write_seen_filter(conn, filter_path)
+    conn.close()
+    
+    # Regenerate foxfood summaries from the full tables.
+    # Start and stop times, and app usage counts, are integers.
+    full_tables = {
+        'info': read_table(csv_dir, au.info_csv, [1, 2]),
+        'app': read_table(csv_dir, au.app_csv, [1, 2] + range(5, 11))
+    }
+    for row in full_tables['app']:
+        row[au.app_activities_index] = au.parse_activities(
+            row[au.app_activities_index])
+    pings_by_device, is_dogfood_device, condition_counts = au.classify_pings(
+        full_tables)
+    au.print_overlap_stats(condition_counts, is_dogfood_device)
+    dogfood_details, dogfood_appusage = au.summarize_dogfood(full_tables, 
+        pings_by_device, is_dogfood_device)
+    au.write_dogfood_tables(dogfood_details, dogfood_appusage, csv_dir)
+    if foxfood_dir is not None:
+        foxfood_report.write_report(dogfood_details, foxfood_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.exit(2)
+    main(*sys.argv[1:6])
+    sys.exit(0)
@@ -0,0 +1,144 @@
+"""
+Load the AU tables into a SQLite database, indexed for ad-hoc lookups by
+device, app and date.
+
+The CSVs written by the AU processing (any of au_data_tables.py,
+au_incremental.py, au_external_sort.py or au_device_tables.py) are loaded
+into tables of the same names, with the same columns. Rows are inserted in a
+single bulk transaction, and the indexes are created once all rows are
+loaded. Columns holding timestamps and counts are stored as integers.
+
+The database is written to a temporary file and then moved into place, so
+that it is replaced as a whole and never seen partially written.
+
+The script expects the following command-line args:
+- the dir path containing the AU CSVs, which are the input to this script
+- the path to the SQLite database to be written.
+"""
+
+import sys
+import csv
+import sqlite3
+import os
+import os.path
+
+import utils.dump_schema as schema
+import au_data_tables as au
+
+# The tables to load, with their CSV file names and columns.
+table_csvs = [
+    ('info', au.info_csv, schema.au_info_csv),
+    ('app', au.app_csv, schema.au_app_csv),
+    ('search', au.search_csv, schema.au_search_csv),
+    ('dogfood_details', au.dogfood_details_csv,
+        schema.au_dogfood_details_csv),
+    ('dogfood_history', au.dogfood_history_csv,
+        schema.au_dogfood_history_csv),
+    ('dogfood_appusage', au.dogfood_appusage_csv,
+        schema.au_dogfood_appusage_csv)
+]
+
+# Columns stored as integers. Other columns are stored as text.
+integer_columns = set([
+    'start_timestamp',
+    'stop_timestamp',
+    'usage_time',
+    'invocations',
+    'installs',
+    'uninstalls',
+    'enables',
+    'disables',
+    'searches',
+    'earliest_start',
+    'latest_stop',
+    'num_pings'
+])
+
+# Indexes to create on each table, as lists of columns.
+table_indexes = {
+    'info': [['deviceID'], ['start_date']],
+    'app': [['deviceID'], ['app_url', 'date'], ['date']],
+    'search': [['deviceID'], ['date']],
+    'dogfood_details': [['deviceID']],
+    'dogfood_history': [['deviceID'], ['field']],
+    'dogfood_appusage': [['deviceID'], ['app_url', 'date'], ['date']]
+}
+
+
+def create_table(conn, name, columns):
+    """Create a table with the given columns."""
+    conn.execute('CREATE TABLE %s (%s)' % (name, ', '.join(
+        ['"%s" %s' % (c, 'INTEGER' if c in integer_columns else 'TEXT')
+            for c in columns])))
+
+
+def create_indexes(conn, name):
+    """Create the indexes for a table."""
+    for columns in table_indexes.get(name, []):
+        conn.execute('CREATE INDEX %s_%s ON %s (%s)' % (name,
+            '_'.join(columns), name, ', '.join(
+                ['"%s"' % c for c in columns])))
+
+
+def read_csv_rows(path, columns):
+    """Iterate over the rows of a CSV with the given header row, as lists of
+    unicode values.
+    """
+    with open(path) as infile:
+        reader = csv.reader(infile)
+        header = reader.next()
+        if header != columns:
+            raise ValueError('Unexpected columns in %s: %s' % (path, header))
+        for row in reader:
+            yield [v.decode('utf-8') for v in row]
+
+
+def load_tables(conn, csv_dir):
+    """Load the AU CSVs found in csv_dir into the database.
+    
+    Returns a list of the names of the tables loaded, with their row counts.
+    """
+    loaded = []
+    # Skip the rollback journal and syncing to disk during the load, since
+    # the database is written to a temporary file.
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    with conn:
+        for name, filename, columns in table_csvs:
+            path = os.path.join(csv_dir, filename)
+            if not os.path.exists(path):
+                continue
+            create_table(conn, name, columns)
+            conn.executemany('INSERT INTO %s VALUES (%s)' % (name,
+                ', '.join(['?'] * len(columns))),
+                read_csv_rows(path, columns))
+            create_indexes(conn, name)
+            nrows = conn.execute('SELECT COUNT(*) FROM %s' %
+                name).fetchone()[0]
+            loaded.append((name, nrows))
+    # Gather statistics for the query planner.
+    conn.execute('ANALYZE')
+    return loaded
+
+
+def main(csv_dir, db_path):
+    """Load the AU CSVs into a new SQLite database at db_path."""
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        loaded = load_tables(conn, csv_dir)
+    finally:
+        conn.close()
+    os.rename(tmp_path, db_path)
+    print('\nWrote SQLite database: %s' % db_path)
+    for name, nrows in loaded:
+        print('%s: %s rows' % (name, nrows))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(2)
+    main(*sys.argv[1:3])
+    sys.exit(0)
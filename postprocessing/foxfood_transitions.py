@@ -0,0 +1,51 @@
+"""
+Report changes to device info for foxfood devices, such as OS updates.
+
+Transitions are read from the dogfood history table written by the AU
+processing (dogfood_history.csv), which records changes to each device info
+field by the start timestamp of the payload where the change was first seen.
+The output CSV has a row for each change in one of the requested fields,
+giving the device, the field, the timestamp, and the previous and new values.
+
+The script expects the following command-line args:
+- the path to the dogfood history CSV, which is the input to this script
+- the path to the CSV to be generated
+- optionally, the names of the fields to report (default: OS and build ID).
+"""
+
+import sys
+import csv
+
+from utils.device_info_history import read_history_csv
+import output_utils as util
+
+csv_headers = ['deviceID', 'field', 'start_timestamp', 'previous_value',
+    'new_value']
+
+# Fields reported by default.
+default_fields = ['os', 'platform_build_id']
+
+
+def main(history_csv, output_csv, *fields):
+    """Load the dogfood history, and write transitions to CSV."""
+    history = read_history_csv(history_csv)
+    with open(output_csv, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(csv_headers)
+        for field in fields or default_fields:
+            devices = set()
+            n = 0
+            for device_id, start, previous, value in history.transitions(
+                    field):
+                util.write_unicode_row(writer,
+                    [device_id, field, start, previous, value])
+                devices.add(device_id)
+                n += 1
+            print('%s: %s changes on %s devices' % (field, n, len(devices)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(2)
+    main(*sys.argv[1:])
+    sys.exit(0)
@@ -2,10 +2,10 @@
 Load the data outputted by the map-reduce job, and store as CSVs to be passed 
 to the dashboards.
 
-The rows of data are loaded from the map-reduce output. Rows submitted within 
-the last three months are written as-is to the dump CSV, and rows submitted
-within the last six months are summarized and written to the CSV powering the
-dashboard.
+The rows of data are streamed from the map-reduce output. Rows within the 
+dump range (submitted on or after earliest_for_dump, ie. within the last 
+dump_range days) are written as-is to the dump CSV as they are read, and all 
+rows are summarized and accumulated for the CSV powering the dashboard.
 
 The dashboard dataset only retains a small subset of the original columns, and
 values that are not considered relevant (eg. countries that have not had a 
@@ -26,6 +26,7 @@ from datetime import date, timedelta
 import utils.mapred as mapred
 import utils.ftu_formatter as ftu
 import utils.dump_schema as schema
+import utils.date_window as window
 import output_utils as util
 
 # Each datum will now be a tuple whose order is determined by 
@@ -35,19 +36,54 @@ field_index = dict(
     zip(schema.final_keys, range(0, len(schema.final_keys) - 1)))
 
 # The number of days before today the dashboard dataset should cover.
-dashboard_range = 180
+# This is the submission date window shared with the FTU job.
+dashboard_range = window.windows['ftu']['submission_days']
 # The number of days before today the dump dataset should cover.
 dump_range = 180
 
 # Cutoff dates for inclusion in datasets.
 # No later than yesterday. 
 latest_date = (date.today() - timedelta(days = 1)).isoformat()
-# No earlier than 180 days ago. 
-earliest_date = (date.today() - timedelta(days = dashboard_range)).isoformat()
-# Cutoff date for inclusion in dump csv is 3 months before today.
+# No earlier than the start of the FTU window (dashboard_range days ago). 
+earliest_date, earliest_ping = window.get_window_dates('ftu')
+# Cutoff date for inclusion in dump csv is dump_range days before today.
 earliest_for_dump = (date.today() - timedelta(days = dump_range)).isoformat()
 
 
+class SummaryTable(dict):
+    """Mapping of distinct raw values to their dashboard summaries. 
+    
+    The summary for a value is computed using the given summarize function 
+    the first time it is looked up, and stored for subsequent lookups.
+    """
+    
+    def __init__(self, summarize):
+        dict.__init__(self)
+        self.summarize = summarize
+    
+    def __missing__(self, val):
+        summary = self.summarize(val)
+        self[val] = summary
+        return summary
+
+
+# Summaries for the distinct values seen in each of the dashboard columns.
+# Since raw values repeat heavily, the whitelist checks in utils/ftu_formatter
+# only get applied once per distinct value.
+os_summaries = SummaryTable(ftu.summarize_os)
+country_summaries = SummaryTable(ftu.summarize_country)
+device_summaries = SummaryTable(ftu.summarize_device)
+operator_summaries = SummaryTable(ftu.summarize_operator_name)
+
+# Indices of the fields used by the dashboard.
+submission_date_index = field_index['submissionDate']
+os_index = field_index['os']
+country_index = field_index['country']
+device_index = field_index['product_model']
+operator_indices = tuple([field_index[k] for k in 
+    ['icc.network', 'icc.name', 'network.network', 'network.name']])
+
+
 def accumulate_dashboard_row(dataset, raw_row):
     """Convert a raw datum to a row for the dashboard CSV, and add to dataset.
     
@@ -56,62 +92,94 @@ def accumulate_dashboard_row(dataset, raw_row):
     a dict mapping rows to occurrence counts, and the count is updated if
     necessary.     
     """
-    new_row = []
-    # Extract relevant fields, and check them against lookup tables.
+    icc_network, icc_name, network_network, network_name = operator_indices
+    # The operator is the first non-empty network field, as in 
+    # ftu.summarize_operator().
+    operator = (raw_row[icc_network] or raw_row[icc_name] or 
+        raw_row[network_network] or raw_row[network_name])
+    # Extract relevant fields, and look up their summaries.
     # See dump_schema.py for list indices.
-    new_row.append(raw_row[field_index['submissionDate']])
-    new_row.append(ftu.summarize_os(raw_row[field_index['os']]))
-    new_row.append(ftu.summarize_country(raw_row[field_index['country']]))
-    new_row.append(ftu.summarize_device(raw_row[field_index['product_model']]))
-    new_row.append(ftu.summarize_operator(
-        raw_row[field_index['icc.network']], 
-        raw_row[field_index['icc.name']], 
-        raw_row[field_index['network.network']], 
-        raw_row[field_index['network.name']]
-    ))
-    new_row = tuple(new_row)
+    new_row = (
+        raw_row[submission_date_index],
+        os_summaries[raw_row[os_index]],
+        country_summaries[raw_row[country_index]],
+        device_summaries[raw_row[device_index]],
+        operator_summaries[operator]
+    )
     # Add occurrence count from the original data.
     count = raw_row[-1]
     # Add new row to dashboard dataset, accumulating counts if necessary.
-    if new_row not in dataset:
-        dataset[new_row] = count
-    else:
-        dataset[new_row] = dataset[new_row] + count
+    dataset[new_row] = dataset.get(new_row, 0) + count
+
+
+def iter_window_records(job_output, data):
+    """Iterate over the records in the map-reduce output whose dates fall 
+    within the dashboard window.
+    
+    Records are parsed one at a time as they are read from the job output 
+    file, with the count appended as an int. Counters and conditions are 
+    collected in data as for mapred.iter_output_tuple().
+    """
+    for r, count in mapred.iter_output_tuple(job_output, data):
+        # Make sure the count is numeric.
+        r.append(int(count))
+        record_date = r[field_index['submissionDate']]
+        if record_date == '':
+            continue
+        if record_date > latest_date or record_date < earliest_date:
+            continue
+        if (earliest_ping is not None and 
+                '' < r[field_index['pingDate']] < earliest_ping):
+            continue
+        yield r
+
+
+def update_dump_store(store, partitions):
+    """Write dump rows to the dump store, and remove partitions which have 
+    fallen outside the dump range.
+    
+    partitions maps submission dates to column tables of rows, which replace 
+    any existing partitions for those dates. The store index is saved.
+    """
+    for date in sorted(partitions):
+        store.write_partition(date, partitions[date])
+    for date in store.dates():
+        if date < earliest_for_dump:
+            store.remove_partition(date)
+    store.save_index()
 
 
 def main(job_output, dashboard_csv, dump_csv):
     """Load map-reduce output, and write relevant subsets to CSVs.
     
-    The dump CSV includes full rows from the job output, but limited to a 
-    specific submission date range. The dashboard CSV is limited by submission 
-    date, but also restricted to certain columns.
+    The dump CSV includes full rows from the job output, but limited to the 
+    dump range (rows submitted on or after earliest_for_dump). The dashboard 
+    CSV covers the full FTU window, but is restricted to certain columns.
+    
+    The job output is processed in a single pass: dump rows are written as 
+    they are read, and only the dashboard aggregate is kept in memory.
     
     Input args are the path to the file containing the map-reduce job output,
     stored using the tuple-based formatting defined in utils/mapred.py, and 
     paths to the dashboard CSV and dump CSV to be written. 
     """
-    data = mapred.parse_output_tuple(job_output)
+    data = {'counters': {}, 'conditions': {}}
     
-    # Accumulate subsets of data to be converted to CSV.
-    # Dump rows will be stored as a list of row lists. 
-    dump_rows = []
     # Dashboard rows will be stored as a mapping of value tuples to a count.
     dash_rows = {}
-    for r in data['records']:
-        # Make sure the count is numeric.
-        r[-1] = int(r[-1])
-        record_date = r[field_index['submissionDate']]
-        if record_date == '':
-            continue
-        if record_date > latest_date or record_date < earliest_date:
-            continue
-        # Add to dashboard data. 
-        accumulate_dashboard_row(dash_rows, r)
-        # Add to dump CSV if required. 
-        if record_date >= earliest_for_dump:
-            dump_rows.append(r)
+    n_dump_rows = 0
+    with open(dump_csv, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(schema.dump_csv_headers)
+        for r in iter_window_records(job_output, data):
+            # Add to dashboard data. 
+            accumulate_dashboard_row(dash_rows, r)
+            # Add to dump CSV if required. 
+            if r[field_index['submissionDate']] >= earliest_for_dump:
+                util.write_unicode_row(writer, r)
+                n_dump_rows += 1
     
-    # Write to output files.
+    # Write the dashboard aggregate.
     headers = schema.dashboard_csv_headers
     with open(dashboard_csv, 'w') as outfile:
         writer = csv.writer(outfile)
@@ -122,19 +190,12 @@ def main(job_output, dashboard_csv, dump_csv):
             util.write_unicode_row(writer, next_row)
     
     print('Wrote dashboard CSV: %s rows\n' % len(dash_rows))
-    
-    headers = schema.dump_csv_headers
-    with open(dump_csv, 'w') as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(headers)
-        for r in dump_rows:
-            util.write_unicode_row(writer, r)
-    
-    print('Wrote dump CSV: %s rows\n' % len(dump_rows))
+    print('Wrote dump CSV: %s rows\n' % n_dump_rows)
     
     # Output counters and diagnostics.
     print('Counters:')
     util.print_counter_info(data['counters'])
+    util.print_sampling_info(data['counters'])
     print('\nError conditions:')
     util.print_condition_info(data['conditions'])
 
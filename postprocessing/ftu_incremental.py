@@ -0,0 +1,213 @@
+"""
+Incrementally update the FTU dashboard and dump CSVs from the output of a 
+map-reduce job covering only the most recent submission dates.
+
+The dashboard rows computed by ftu_dashboard_datasets.accumulate_dashboard_row
+are persisted in a store directory, partitioned by submission date, with one 
+CSV per date. The running aggregate is kept in the store as well: new dates 
+are added to it, dates that have been reprocessed are replaced, and dates 
+falling outside the dashboard range are subtracted and their partitions 
+deleted. The list of dates included in the aggregate is kept alongside it, 
+and the aggregate is copied to the dashboard CSV after each update. 
+
+If the job output does not reach back to the day after the latest date 
+already in the store (eg. because a run was missed), the update fails 
+without changing the store, and the store should be refreshed from a full 
+job output. The update also fails if the store and job output together do 
+not reach back to the start of the dashboard range (earliest_date), eg. for a
+new store, so that a partial dashboard is never published.
+
+Raw dump rows are stored by date in a columnar dump store, with one 
+compressed chunk per date (see utils/ftu_dump_store.py). The dump CSV is 
+regenerated from the partitions within the dump range, which are looked up 
+in the store's index, and older partitions are removed.
+
+To initialize the store, run on the output of a full (non-incremental) job. 
+If the whitelists in utils/lookup/ftu-fields.json change, the store should be
+rebuilt in the same way.
+
+The script expects the following command-line args:
+- the path to the map-reduce output file, which is the input to this script
+- the path to the store directory
+- the path to the dashboard CSV to be updated
+- the path to the dump CSV to be generated.
+"""
+
+import os
+import sys
+import csv
+import shutil
+from collections import defaultdict
+
+import utils.dump_schema as schema
+import utils.date_window as window
+from utils.ftu_dump_store import DumpStore
+import output_utils as util
+from generate_dump_csv import write_dump_csv
+from ftu_dashboard_datasets import (field_index, accumulate_dashboard_row, 
+    iter_window_records, update_dump_store, latest_date, earliest_date, 
+    earliest_for_dump)
+
+# Store layout.
+dashboard_partitions = 'dashboard'
+dump_partitions = 'dump_store'
+dates_file = 'dashboard_dates'
+aggregate_file = 'dashboard_aggregate.csv'
+
+
+def partition_path(store_dir, subdir, date):
+    """Path to the CSV for a single submission date."""
+    return os.path.join(store_dir, subdir, date + '.csv')
+
+
+def read_counts(path):
+    """Load a CSV of dashboard rows into a dict mapping row tuples to counts.
+    
+    The final column is taken to be the count.
+    """
+    counts = {}
+    with open(path) as infile:
+        reader = csv.reader(infile)
+        # Skip headers.
+        next(reader)
+        for row in reader:
+            counts[tuple([v.decode('utf-8') for v in row[:-1]])] = int(row[-1])
+    return counts
+
+
+def write_counts(path, counts):
+    """Write a dict of dashboard rows mapping to counts as a CSV."""
+    with open(path, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(schema.dashboard_csv_headers)
+        for r in sorted(counts):
+            util.write_unicode_row(writer, list(r) + [counts[r]])
+
+
+def add_counts(aggregate, counts, sign = 1):
+    """Add (or subtract, if sign is -1) counts into an aggregate in place. 
+    
+    Rows whose count drops to zero are removed.
+    """
+    for r, n in counts.iteritems():
+        total = aggregate.get(r, 0) + sign * n
+        if total == 0:
+            aggregate.pop(r, None)
+        else:
+            aggregate[r] = total
+
+
+def load_state(store_dir):
+    """Load the current dashboard aggregate and the set of dates it includes.
+    
+    If the store has no record of the aggregate, it is rebuilt from the 
+    stored partitions.
+    """
+    path = os.path.join(store_dir, dates_file)
+    aggregate_path = os.path.join(store_dir, aggregate_file)
+    if os.path.exists(path) and os.path.exists(aggregate_path):
+        with open(path) as infile:
+            dates = set(line.strip() for line in infile if line.strip())
+        return read_counts(aggregate_path), dates
+    aggregate = {}
+    dates = set()
+    partition_dir = os.path.join(store_dir, dashboard_partitions)
+    for filename in os.listdir(partition_dir):
+        date = filename[:-4]
+        if earliest_date <= date <= latest_date:
+            add_counts(aggregate, read_counts(os.path.join(partition_dir, 
+                filename)))
+            dates.add(date)
+    return aggregate, dates
+
+
+def main(job_output, store_dir, dashboard_csv, dump_csv):
+    """Load map-reduce output for recent dates, and update the dashboard 
+    aggregate and dump CSV.
+    """
+    if not os.path.isdir(os.path.join(store_dir, dashboard_partitions)):
+        os.makedirs(os.path.join(store_dir, dashboard_partitions))
+    dump_store = DumpStore(os.path.join(store_dir, dump_partitions))
+    
+    data = {'counters': {}, 'conditions': {}}
+    
+    # Summarize the new data by submission date.
+    new_dash_rows = defaultdict(dict)
+    new_dump_rows = defaultdict(dump_store.new_partition)
+    for r in iter_window_records(job_output, data):
+        record_date = r[field_index['submissionDate']]
+        accumulate_dashboard_row(new_dash_rows[record_date], r)
+        if record_date >= earliest_for_dump:
+            new_dump_rows[record_date].append(r)
+    
+    aggregate, dates = load_state(store_dir)
+    missing = window.missing_dates(dates, new_dash_rows.keys())
+    if missing:
+        raise ValueError('Job output starts at %s, but the store only covers '
+            'dates up to %s. Rerun on the output of a full job to fill in '
+            'the %s missing dates.' % (min(new_dash_rows), max(dates), 
+                len(missing)))
+    covered = dates | set(new_dash_rows)
+    if not covered or min(covered) > earliest_date:
+        raise ValueError('The store and job output only cover dates from %s, '
+            'but the dashboard starts at %s. Rerun on the output of a full '
+            'job to initialize the store.' % (min(covered) if covered else 
+                None, earliest_date))
+    
+    # Replace or add the partitions for the new dates.
+    for date in sorted(new_dash_rows):
+        path = partition_path(store_dir, dashboard_partitions, date)
+        if date in dates and os.path.exists(path):
+            add_counts(aggregate, read_counts(path), -1)
+        write_counts(path, new_dash_rows[date])
+        add_counts(aggregate, new_dash_rows[date])
+        dates.add(date)
+    if new_dash_rows:
+        print('Updated %s dates from %s to %s' % (len(new_dash_rows), 
+            min(new_dash_rows), max(new_dash_rows)))
+    
+    # Subtract dates that have fallen outside the dashboard range, and 
+    # delete their partitions.
+    expired = sorted([d for d in dates if d < earliest_date])
+    for date in expired:
+        path = partition_path(store_dir, dashboard_partitions, date)
+        if os.path.exists(path):
+            add_counts(aggregate, read_counts(path), -1)
+        dates.remove(date)
+    partition_dir = os.path.join(store_dir, dashboard_partitions)
+    for filename in os.listdir(partition_dir):
+        if filename[:-4] < earliest_date:
+            os.remove(os.path.join(partition_dir, filename))
+    if expired:
+        print('Removed %s expired dates' % len(expired))
+    
+    # Save the updated state, and publish the aggregate.
+    aggregate_path = os.path.join(store_dir, aggregate_file)
+    write_counts(aggregate_path, aggregate)
+    with open(os.path.join(store_dir, dates_file), 'w') as outfile:
+        for date in sorted(dates):
+            outfile.write(date + '\n')
+    shutil.copyfile(aggregate_path, dashboard_csv)
+    print('Wrote dashboard CSV: %s rows\n' % len(aggregate))
+    
+    # Store the new dump rows, remove partitions which have fallen outside 
+    # the dump range, and regenerate the dump CSV from the remaining 
+    # partitions.
+    update_dump_store(dump_store, new_dump_rows)
+    nrows = write_dump_csv(dump_store, dump_csv, earliest_for_dump, 
+        latest_date)
+    print('Wrote dump CSV: %s rows\n' % nrows)
+    
+    # Output counters and diagnostics.
+    print('Counters:')
+    util.print_counter_info(data['counters'])
+    util.print_sampling_info(data['counters'])
+    print('\nError conditions:')
+    util.print_condition_info(data['conditions'])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        sys.exit(2)
+    main(*sys.argv[1:5])
+    sys.exit(0)
@@ -0,0 +1,268 @@
+"""
+Query FTU activation counts sliced by any of the dashboard dimensions over a
+range of submission dates.
+
+The FTU aggregate is loaded once, either from the dashboard CSV (dimensions
+as in dump_schema.dashboard_csv_headers), or from the dump store maintained
+by ftu_incremental.py, in which case the rows are summarized as for the
+dashboard and the update channel is added as a further dimension. Rows are
+sorted by date, so that a date range is a contiguous slice, and each value of
+the other dimensions gets a bitmap (NumPy bool array) marking the rows having
+that value. A query ANDs together the bitmaps for the filtered dimensions
+(ORing them for multiple values of a dimension), and sums the counts for the
+selected rows, grouped by the requested dimensions.
+
+The script expects the following command-line args:
+- the path to the dashboard CSV or the dump store dir
+- optionally, any of the following, in the form name=value:
+    start=<date>, stop=<date>: the submission date range (inclusive)
+    group=<dim>,<dim>,...: the dimensions to group counts by
+    <dim>=<value>|<value>|...: restrict a dimension to the given values.
+Grouped counts are written to stdout as CSV.
+"""
+
+import os.path
+import sys
+import csv
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import utils.dump_schema as schema
+from utils.ftu_dump_store import DumpStore
+from ftu_dashboard_datasets import field_index, accumulate_dashboard_row
+import output_utils as util
+
+# The dimensions of the dashboard CSV, excluding the count.
+dashboard_dimensions = schema.dashboard_csv_headers[:-1]
+# Dimensions for counts loaded from the dump store.
+dump_dimensions = dashboard_dimensions + ['channel']
+
+
+def read_dashboard_csv(path):
+    """Load the dashboard CSV as a list of rows of dimension values followed
+    by the count.
+    """
+    rows = []
+    with open(path) as infile:
+        reader = csv.reader(infile)
+        headers = reader.next()
+        if headers != schema.dashboard_csv_headers:
+            raise ValueError('Unexpected columns in %s' % path)
+        for row in reader:
+            row = [v.decode('utf-8') for v in row]
+            row[-1] = int(row[-1])
+            rows.append(row)
+    return rows
+
+
+def read_dump_store(store_dir, start = None, stop = None):
+    """Summarize the dump rows submitted between start and stop inclusive as
+    rows of dashboard values and update channel, followed by the count.
+    """
+    by_channel = defaultdict(dict)
+    channel_index = field_index['update_channel_standardized']
+    for r in DumpStore(store_dir).iter_rows(start, stop):
+        accumulate_dashboard_row(by_channel[r[channel_index]], r)
+    rows = []
+    for channel, dash_rows in by_channel.iteritems():
+        for r, n in dash_rows.iteritems():
+            rows.append(list(r) + [channel, n])
+    return rows
+
+
+def as_value_list(values):
+    """Allow filter values to be given as a single value or a sequence."""
+    if isinstance(values, (list, tuple, set)):
+        return values
+    return [values]
+
+
+def scan_counts(dimensions, rows, start = None, stop = None, group_by = (),
+        **filters):
+    """Answer a count query by scanning all rows.
+
+    This gives the same results as CountIndex.count(), and is used when
+    NumPy is not available.
+    """
+    date = dimensions.index('date')
+    tests = [(dimensions.index(dim), set(as_value_list(values)))
+        for dim, values in filters.iteritems()]
+    groups = [dimensions.index(dim) for dim in group_by]
+    counts = {}
+    for r in rows:
+        if start is not None and r[date] < start:
+            continue
+        if stop is not None and r[date] > stop:
+            continue
+        if not all(r[i] in values for i, values in tests):
+            continue
+        key = tuple([r[i] for i in groups])
+        counts[key] = counts.get(key, 0) + r[-1]
+    return counts
+
+
+class CountIndex(object):
+    """Bitmap-indexed counts over a set of dimensions.
+
+    Rows are lists of values for the given dimensions, which must include
+    'date', followed by a count.
+    """
+
+    def __init__(self, dimensions, rows):
+        if np is None:
+            raise ImportError('CountIndex requires NumPy')
+        self.dimensions = list(dimensions)
+        date = self.dimensions.index('date')
+        rows = sorted(rows, key = lambda r: r[date])
+        self.counts = np.array([r[-1] for r in rows], dtype=np.int64)
+        # Distinct values and per-row value codes for each dimension.
+        self.values = {}
+        self.codes = {}
+        # Bitmaps for each value of each dimension other than date.
+        self.bitmaps = {}
+        for i, dim in enumerate(self.dimensions):
+            column = [r[i] for r in rows]
+            values = sorted(set(column))
+            code_index = dict((v, c) for c, v in enumerate(values))
+            codes = np.array([code_index[v] for v in column], dtype=np.int32)
+            self.values[dim] = values
+            self.codes[dim] = codes
+            if dim != 'date':
+                self.bitmaps[dim] = dict((v, codes == c)
+                    for c, v in enumerate(values))
+        # Row offsets for the start of each date, and the end of the last.
+        date_codes = self.codes['date']
+        self.date_offsets = np.searchsorted(date_codes,
+            np.arange(len(self.values['date']) + 1)).tolist()
+
+    def __len__(self):
+        return len(self.counts)
+
+    def date_range(self, start = None, stop = None):
+        """Return the slice of rows submitted between start and stop
+        inclusive.
+        """
+        dates = self.values['date']
+        first = 0 if start is None else bisect_left(dates, start)
+        last = len(dates) if stop is None else bisect_right(dates, stop)
+        if first >= last:
+            return slice(0, 0)
+        return slice(self.date_offsets[first], self.date_offsets[last])
+
+    def mask(self, rows, filters):
+        """Return the bitmap of the rows within the slice matching all the
+        filters, or None if there are no filters.
+        """
+        mask = None
+        for dim, values in filters.iteritems():
+            if dim == 'date':
+                dates = np.zeros(len(self.values['date']), dtype=bool)
+                for v in as_value_list(values):
+                    i = bisect_left(self.values['date'], v)
+                    if i < len(dates) and self.values['date'][i] == v:
+                        dates[i] = True
+                matches = dates[self.codes['date'][rows]]
+            else:
+                bitmaps = self.bitmaps[dim]
+                matches = np.zeros(rows.stop - rows.start, dtype=bool)
+                for v in as_value_list(values):
+                    if v in bitmaps:
+                        matches |= bitmaps[v][rows]
+            if mask is None:
+                mask = matches
+            else:
+                mask &= matches
+        return mask
+
+    def count(self, start = None, stop = None, group_by = (), **filters):
+        """Sum the counts for rows submitted between start and stop inclusive,
+        restricted to the given values of any dimensions passed as keyword
+        args (a single value or a list of values).
+
+        Returns a dict mapping tuples of values for the group_by dimensions
+        to counts, omitting empty groups. With no grouping, the total count is
+        keyed by the empty tuple.
+        """
+        for dim in list(group_by) + filters.keys():
+            if dim not in self.codes:
+                raise ValueError('Unknown dimension: %s' % dim)
+        rows = self.date_range(start, stop)
+        mask = self.mask(rows, filters)
+        counts = self.counts[rows]
+        if mask is not None:
+            counts = counts[mask]
+        if not group_by:
+            return {(): int(counts.sum())} if len(counts) else {}
+        # Combine the codes for the grouping dimensions into a single key.
+        keys = np.zeros(len(counts), dtype=np.int64)
+        nkeys = 1
+        for dim in group_by:
+            codes = self.codes[dim][rows]
+            if mask is not None:
+                codes = codes[mask]
+            keys *= len(self.values[dim])
+            keys += codes
+            nkeys *= len(self.values[dim])
+        if nkeys <= len(keys):
+            # Few enough possible keys to count them directly.
+            groups = np.flatnonzero(np.bincount(keys, minlength=nkeys))
+            sums = np.bincount(keys, weights=counts, minlength=nkeys)[groups]
+        else:
+            groups, inverse = np.unique(keys, return_inverse=True)
+            sums = np.bincount(inverse, weights=counts)
+        # Split the group keys back into the values for each dimension.
+        group_values = []
+        for dim in reversed(group_by):
+            values = self.values[dim]
+            groups, codes = np.divmod(groups, len(values))
+            group_values.append([values[c] for c in codes.tolist()])
+        group_values.reverse()
+        return dict(zip(zip(*group_values), sums.astype(np.int64).tolist()))
+
+
+def load_counts(source, start = None, stop = None):
+    """Load FTU counts from the dashboard CSV or dump store at source.
+
+    Returns the list of dimensions and the list of rows. Rows from the dump
+    store can be restricted to a date range when loading.
+    """
+    if os.path.isdir(source):
+        return dump_dimensions, read_dump_store(source, start, stop)
+    return dashboard_dimensions, read_dashboard_csv(source)
+
+
+def main(source, *args):
+    """Run a single count query and write the result as CSV to stdout."""
+    query = {}
+    filters = {}
+    for arg in args:
+        name, value = arg.split('=', 1)
+        if name in ('start', 'stop'):
+            query[name] = value
+        elif name == 'group':
+            query['group_by'] = value.split(',')
+        else:
+            filters[name] = value.decode('utf-8').split('|')
+    dimensions, rows = load_counts(source, query.get('start'),
+        query.get('stop'))
+    if np is None:
+        counts = scan_counts(dimensions, rows, **dict(query, **filters))
+    else:
+        counts = CountIndex(dimensions, rows).count(**dict(query,
+            **filters))
+    writer = csv.writer(sys.stdout)
+    writer.writerow(query.get('group_by', []) + ['activations'])
+    for key in sorted(counts):
+        util.write_unicode_row(writer, list(key) + [counts[key]])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(2)
+    main(*sys.argv[1:])
+    sys.exit(0)
@@ -1,52 +1,54 @@
-# Convert the ouptput of the dump job to a CSV.
+"""
+Generate the FTU dump CSV from the date-partitioned dump store maintained by
+ftu_incremental.py (see utils/ftu_dump_store.py).
 
-# Arguments supplied should be the input data file and the output CSV file. 
+Only the partitions for submission dates within the cutoff are read.
 
-import os.path
-import sys
-import csv
+The store is only populated by incremental runs. It covers the dump range 
+of ftu_dashboard_datasets.py (earliest_for_dump onwards), so a longer cutoff 
+does not add older rows.
 
-# Hack to be able to import from required directory. 
-# sys.path.append(os.path.join(os.path.dirname(sys.path[0]), 'shared'))
+The script expects the following command-line args:
+- the path to the dump store dir
+- the path to the dump CSV to be generated
+- optionally, the number of days before today to include (default: 90).
+"""
 
-import utils.mapred as mapred
-import utils.dump_schema as schema
+import sys
+import csv
 from datetime import date, timedelta
 
-job_output = sys.argv[1]
-csv_file = sys.argv[2]
-
-# Parse in output file.
-data = mapred.parse_output_tuple(job_output)
-
-# Cutoff date is within 3 months of today.
-cutoff_date = date.today() - timedelta(days = 90)
-cutoff_date = cutoff_date.isoformat()
-data_records = [ r for r in data['records'] if r[1] >= cutoff_date ]
-
-# Output records to CSV.
-headers = schema.dump_csv_headers
-headers.append('count')
-
-with open(csv_file, 'w') as outfile:
-    writer = csv.writer(outfile)
-    writer.writerow(headers)
-    writer.writerows(data_records)
-
-print('CSV written.')
-
-# Output meta info to stdout. 
-print('Counters:')
-for name in data['counters']:
-    counter = data['counters'][name]
-    # If this is a group, print all subcounters.
-    if type(counter) is dict:
-        for cname in counter:
-            print(name + ' | ' + cname + ' :  ' + str(counter[cname]))
-    else:
-        print(name + ' :  ' + str(counter))
-
-print('Error conditions:')
-for name in data['conditions']:
-    print(name + ' :  ' + str(data['conditions'][name]))
-
+import utils.dump_schema as schema
+from utils.ftu_dump_store import DumpStore
+import output_utils as util
+
+# The default number of days before today the dump CSV should cover.
+default_days = 90
+
+
+def write_dump_csv(store, csv_file, start = None, stop = None):
+    """Write the rows in the store submitted between start and stop
+    inclusive to CSV. Returns the number of rows written.
+    """
+    nrows = 0
+    with open(csv_file, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(schema.dump_csv_headers)
+        for r in store.iter_rows(start, stop):
+            util.write_unicode_row(writer, r)
+            nrows += 1
+    return nrows
+
+
+def main(store_dir, csv_file, days = default_days):
+    """Write the dump CSV for the given number of days before today."""
+    cutoff_date = (date.today() - timedelta(days = int(days))).isoformat()
+    nrows = write_dump_csv(DumpStore(store_dir), csv_file, cutoff_date)
+    print('Wrote dump CSV: %s rows\n' % nrows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(2)
+    main(*sys.argv[1:4])
+    sys.exit(0)
@@ -0,0 +1,145 @@
+"""
+Identify inactive foxfooders from the AU foxfood device summaries.
+
+Foxfood devices are listed by IMEI in the file foxfood_imei.txt. Of the
+listed devices which have had app usage since Whistler, those whose latest
+app usage was more than 21 days ago are to be contacted, and are written to
+inactive_foxfooders.csv. Listed devices with no app usage since then are
+written to unactivated_foxfooders.txt.
+
+This is run as an output stage of au_data_tables.py and au_incremental.py 
+from the in-memory device details, so the 21-day cutoff is relative to the 
+date the AU data was processed. report_inactive_foxfooders.sh only copies the
+report. It can also be run on its own from the dogfood details CSV (as done
+by update_au_dogfood_data.sh for the AU processing variants which do not keep
+the details in memory), in which case the script expects the following 
+command-line args:
+- the dir path containing foxfood_imei.txt, to write the outputs to
+- the path to the dogfood details CSV.
+"""
+
+import sys
+import csv
+import os.path
+from datetime import date, timedelta
+
+import utils.dump_schema as schema
+from utils.dogfood_summary import device_info_fields
+
+imei_file = 'foxfood_imei.txt'
+inactive_csv = 'inactive_foxfooders.csv'
+unactivated_file = 'unactivated_foxfooders.txt'
+
+# Only consider devices with app usage after this date (Whistler).
+earliest_appusage = '2015-06-22'
+# Devices with no app usage for this many days are considered inactive.
+inactive_days = 21
+
+inactive_csv_headers = [
+    'deviceID',
+    'earliest_ping',
+    'latest_ping',
+    'earliest_appusage',
+    'latest_appusage',
+    'num_pings_received',
+    'country'
+]
+
+
+def read_imeis(path):
+    """Read the list of foxfood device IMEIs, one per line."""
+    with open(path) as infile:
+        return [line.strip().decode('utf-8') for line in infile
+            if line.strip()]
+
+
+def find_inactive_foxfooders(dogfood_details, imeis, today = None):
+    """Find the inactive and unactivated devices among the listed IMEIs.
+
+    The device details are as computed by summarize_dogfood() in
+    au_data_tables.py. Returns a list of rows for the inactive devices, and a
+    list of the IMEIs with no app usage since Whistler.
+    """
+    if today is None:
+        today = date.today()
+    cutoff = str(today - timedelta(inactive_days))
+    imei_set = set(imeis)
+    active_since_whistler = set()
+    inactive = []
+    country = device_info_fields.index('country')
+    for device_id in sorted(dogfood_details):
+        vals = dogfood_details[device_id]
+        if (device_id not in imei_set or
+                not vals['latest_appusage'] > earliest_appusage):
+            continue
+        active_since_whistler.add(device_id)
+        if vals['latest_appusage'] < cutoff:
+            inactive.append([device_id, vals['earliest_submission'],
+                vals['latest_submission'], vals['earliest_appusage'],
+                vals['latest_appusage'], vals['num_pings'],
+                vals['info'][country]])
+    unactivated = [imei for imei in imeis
+        if imei not in active_since_whistler]
+    return inactive, unactivated
+
+
+def write_report(dogfood_details, foxfood_dir):
+    """Write the inactive and unactivated foxfooders to the foxfood dir.
+
+    Any previous outputs are removed first, so that they are not mistaken for
+    the current report if this fails. Skipped if the foxfood dir has no list
+    of IMEIs.
+    """
+    for filename in inactive_csv, unactivated_file:
+        path = os.path.join(foxfood_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+    imei_path = os.path.join(foxfood_dir, imei_file)
+    if not os.path.exists(imei_path):
+        print('\nNo foxfood IMEI list found at %s' % imei_path)
+        return
+    inactive, unactivated = find_inactive_foxfooders(dogfood_details,
+        read_imeis(imei_path))
+    with open(os.path.join(foxfood_dir, inactive_csv), 'w') as outfile:
+        writer = csv.writer(outfile, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(inactive_csv_headers)
+        for row in inactive:
+            writer.writerow([v.encode('utf-8') if isinstance(v, unicode)
+                else v for v in row])
+    with open(os.path.join(foxfood_dir, unactivated_file), 'w') as outfile:
+        for imei in unactivated:
+            outfile.write(imei.encode('utf-8') + '\n')
+    print('\nWrote inactive foxfooders CSV: %s rows' % len(inactive))
+    print('Wrote unactivated foxfooders: %s devices' % len(unactivated))
+
+
+def read_dogfood_details(details_csv):
+    """Load the device details needed for the report from the dogfood
+    details CSV.
+    """
+    dogfood_details = {}
+    with open(details_csv) as infile:
+        reader = csv.reader(infile)
+        headers = reader.next()
+        if headers != schema.au_dogfood_details_csv:
+            raise ValueError('Unexpected columns in %s' % details_csv)
+        info_start = len(headers) - len(device_info_fields)
+        for row in reader:
+            row = [v.decode('utf-8') for v in row]
+            vals = dict(zip(headers[1:info_start], row[1:info_start]))
+            vals['num_pings'] = int(vals['num_pings'])
+            vals['info'] = row[info_start:]
+            dogfood_details[row[0]] = vals
+    return dogfood_details
+
+
+def main(foxfood_dir, details_csv):
+    """Write the report from the dogfood details CSV."""
+    write_report(read_dogfood_details(details_csv), foxfood_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(2)
+    main(*sys.argv[1:3])
+    sys.exit(0)
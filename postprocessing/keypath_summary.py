@@ -0,0 +1,63 @@
+"""
+Summarize the output of the awsjobs/adhoc/unique_keys.py job.
+
+Keypath counts are reconstructed by joining the per-signature payload counts 
+to the keypaths for each signature. The output CSV has a row for each keypath 
+and value type, giving the number of payloads in which the keypath occurred 
+with that type of value.
+
+The script expects the following command-line args:
+- the path to the map-reduce output file, which is the input to this script
+- the path to the CSV to be generated.
+"""
+
+import sys
+import csv
+from collections import defaultdict
+
+import utils.mapred as mapred
+import output_utils as util
+
+csv_headers = ['keypath', 'value_type', 'count']
+
+
+def main(job_output, output_csv):
+    """Load map-reduce output, and write keypath counts to CSV."""
+    output = mapred.parse_output_tuple(job_output)
+    
+    # Number of payloads per signature ID.
+    signature_counts = {}
+    # Mapping of signature IDs to their (keypath, value type) pairs.
+    signature_keys = defaultdict(set)
+    for r in output['records']:
+        if r[0] == 'signature':
+            signature_counts[r[1]] = int(r[-1])
+        elif r[0] == 'keypath':
+            signature_keys[r[1]].add((r[2], r[3]))
+    
+    keypath_counts = defaultdict(int)
+    for sig_id, n in signature_counts.iteritems():
+        for keypath_type in signature_keys[sig_id]:
+            keypath_counts[keypath_type] += n
+    
+    with open(output_csv, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(csv_headers)
+        for keypath_type in sorted(keypath_counts):
+            row = list(keypath_type) + [keypath_counts[keypath_type]]
+            util.write_unicode_row(writer, row)
+    
+    print('Wrote keypath CSV: %s rows, from %s payload structures\n' % 
+        (len(keypath_counts), len(signature_counts)))
+    print('Counters:')
+    util.print_counter_info(output['counters'])
+    util.print_sampling_info(output['counters'])
+    print('\nError conditions:')
+    util.print_condition_info(output['conditions'])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(2)
+    main(*sys.argv[1:3])
+    sys.exit(0)
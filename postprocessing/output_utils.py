@@ -25,6 +25,32 @@ def print_counter_info(counters):
             print(name + ' :  ' + str(counter))
 
 
+def get_sampling_rate(counters):
+    """Compute the fraction of records retained by sampling in a MR job, 
+    from the 'sampling' counter group recorded by 
+    utils.payload_utils.sample_payload().
+    
+    Returns 1 if no sampling was applied. Counts from a sampled job can be 
+    scaled up by dividing by this rate.
+    """
+    sampling = counters.get('sampling')
+    if not sampling:
+        return 1
+    kept = sampling.get('kept', 0)
+    total = kept + sampling.get('skipped', 0)
+    return float(kept) / total
+
+
+def print_sampling_info(counters):
+    """Print a notice if the MR job output was sampled."""
+    rate = get_sampling_rate(counters)
+    if rate == 0:
+        print('Job output was sampled, but no records were kept.')
+    elif rate < 1:
+        print(('Job output was sampled at a rate of %.4f: ' +
+            'scale counts by %.2f for estimates.') % (rate, 1 / rate))
+
+
 def print_condition_info(conditions):
     """Format and print the conditions recorded in a MR job using utils.mapred."""
     for name in conditions:
@@ -1,15 +1,37 @@
 #!/bin/bash
 
-# Run R script and copy outputs to dashboard1.
+# Copy the inactive foxfooder report to dashboard1.
+# The report is written by the AU processing (update_au_dogfood_data.sh, see 
+# postprocessing/inactive_foxfooders.py), so the 21-day inactivity cutoff is 
+# relative to the date the AU data was last processed.
 
 . ~/.bash_profile
 . /etc/profile.d/mozilla.sh
 
-THIS_DIR=$(cd "`dirname "$0"`"; pwd)
-cd ~/fxos-data/au/foxfood
+FOXFOOD_DIR=~/fxos-data/au/foxfood
+LAST_UPDATED_PATH=~/fxos-data/au/data_files/last_updated
+ADDR=dzeber@mozilla.com
+
+cd $FOXFOOD_DIR
 exec >> job.log 2>&1
 
-Rscript --vanilla $THIS_DIR/postprocessing/inactive_foxfooders.R
+if [ ! -e foxfood_imei.txt ]; then
+    echo "Foxfood IMEI list not found in $(pwd)" | \
+        mailx -s "Foxfood IMEI job failed!" $ADDR
+    exit 1
+fi
+# The report must have been written after the AU data recorded as the latest 
+# update was downloaded, or else the AU processing failed. Old outputs are 
+# removed before the report is written.
+if [ ! -e inactive_foxfooders.csv ] || [ ! -e unactivated_foxfooders.txt ] || \
+        [ ! -e "$LAST_UPDATED_PATH" ] || \
+        [ "$(date -r inactive_foxfooders.csv +%s)" -lt \
+            "$(date -d "$(cat "$LAST_UPDATED_PATH")" +%s)" ]; then
+    echo "Inactive foxfooder report in $(pwd) is missing or out of date" | \
+        mailx -s "Foxfood IMEI job failed!" $ADDR
+    exit 1
+fi
+
 DEST_DIR=$(ssh $WWW ". .bash_profile; echo \$WWW")
 DEST_DIR="$DEST_DIR/dzeber/foxfooding"
 scp unactivated_foxfooders.txt inactive_foxfooders.csv $WWW:$DEST_DIR
@@ -11,6 +11,9 @@
 # Command-line option --ndays n gives the number of days.
 # --ndays can be combined with either of the other two. 
 # Option --reason can be used to specify the reason string (default is 'ftu').
+# Option --dims gives the comma-separated dims to count by in 
+# adhoc/count_by_dims.py.
+# Option --sample gives the fraction of payloads (by device) to process.
 
 # Earliest date to consider is 2014-04-01.
 START_DATE_DEFAULT="20140401"
@@ -28,6 +31,8 @@ if [ $# -lt 2 ]; then
     echo "    --until <yyyy-mm-dd> : latest date to include"
     echo "    --ndays <n> : number of days to count"
     echo "    --reason : reason string ('ftu' or 'appusage' for FxOS)"
+    echo "    --dims <dim,...> : dims to count by in adhoc/count_by_dims.py"
+    echo "    --sample <rate> : fraction of payloads to process (eg. 0.01)"
     exit 1
 fi
 
@@ -56,6 +61,14 @@ while [ $# -gt 2 ]; do
             shift
             REASON_STRING="$1"
             ;;
+        --dims)
+            shift
+            export FXOS_COUNT_DIMS="$1"
+            ;;
+        --sample)
+            shift
+            export FXOS_SAMPLE_RATE="$1"
+            ;;
         *)
             echo "Invalid option: $1"
             exit 1
@@ -0,0 +1,32 @@
+"""
+Tests for the nested dict functions in utils/payload_utils.py.
+
+Run from the base dir as `python -m unittest discover tests`.
+"""
+
+import unittest
+
+import utils.payload_utils as payload
+
+
+class StructureSignatureTest(unittest.TestCase):
+    
+    def test_distinct_structures_have_distinct_signatures(self):
+        # Moving a key between sibling subdicts visits the same sequence of 
+        # keys and types.
+        a = {'a': {'r': 1}, 'b': {'p': 1, 's': 1}}
+        b = {'a': {'s': 1, 'r': 1}, 'b': {'p': 1}}
+        self.assertNotEqual(sorted(payload.get_keypaths(a)), 
+            sorted(payload.get_keypaths(b)))
+        self.assertNotEqual(payload.get_structure_signature(a), 
+            payload.get_structure_signature(b))
+    
+    def test_same_structure_has_same_signature(self):
+        a = {'a': {'r': 1, 's': 'x'}, 'b': {}}
+        b = {'a': {'r': 2, 's': 'y'}, 'b': {}}
+        self.assertEqual(payload.get_structure_signature(a), 
+            payload.get_structure_signature(b))
+
+
+if __name__ == '__main__':
+    unittest.main()
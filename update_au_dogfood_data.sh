@@ -12,7 +12,7 @@
 
 SRC_DIR=$(cd "`dirname "$0"`"; pwd)
 
-# . $SRC_DIR/settings.env
+. $SRC_DIR/settings.env
 
 # The base dir for the processing script. 
 # Also the working dir for the dashboard data.
@@ -21,6 +21,9 @@ WORK_DIR=$HOME/fxos-data/au
 DUMP_WORK_DIR=$WORK_DIR/aws_job
 # Subdir to contain the processed data files to be copied to the web server.
 DATA_DIR=$WORK_DIR/data_files
+# Subdir containing the list of foxfood IMEIs, where the inactive foxfooder 
+# report is written. It is copied by report_inactive_foxfooders.sh.
+FOXFOOD_DIR=$WORK_DIR/foxfood
 DUMP_TARBALL=au_dump.tar.gz
 
 TARBALL=$DUMP_WORK_DIR/$DUMP_TARBALL
@@ -97,7 +100,43 @@ fi
 # At this point we should have the latest data. 
 echo "Processing data..."
 cd $SRC_DIR
-python -m $PYTHON_MODULE $OUTPUT_DATA $DATA_DIR
+export FXOS_AU_PROCESSES="$AU_PROCESSES"
+if [ "$AU_INCREMENTAL" = "true" ]; then
+    # Merge new payloads into the existing tables.
+    # This fails if the job output leaves a gap after the dates in the store.
+    if ! python -m postprocessing.au_incremental $OUTPUT_DATA \
+            $WORK_DIR/$AU_STORE_FILE $DATA_DIR $SRC_DIR/$AU_SEEN_FILTER \
+            $FOXFOOD_DIR; then
+        echo "Incremental update failed."
+        echo "" | mailx -s "FAILED: FxOS AU data - incremental update" \
+            "$ADDR@mozilla.com" 
+        exit 1
+    fi
+    # Upload the filter of seen payloads for the next AU job.
+    # If this fails, the next job runs without the filter.
+    if [ -n "$AU_SEEN_FILTER_S3" ] && \
+            ! aws s3 cp "$SRC_DIR/$AU_SEEN_FILTER" "$AU_SEEN_FILTER_S3"; then
+        echo "Failed to upload filter of seen payloads."
+        echo "" | mailx -s "FAILED: FxOS AU data - unable to upload $AU_SEEN_FILTER" \
+            "$ADDR@mozilla.com" 
+    fi
+elif [ "$AU_REDUCE_BY_DEVICE" = "true" ]; then
+    # The job output already contains the per-device summaries.
+    python -m postprocessing.au_device_tables $OUTPUT_DATA $DATA_DIR
+    python -m postprocessing.inactive_foxfooders $FOXFOOD_DIR \
+        $DATA_DIR/dogfood_details.csv
+elif [ "$AU_OUT_OF_CORE" = "true" ]; then
+    # Sort rows by device in temporary files under the work dir.
+    python -m postprocessing.au_external_sort $OUTPUT_DATA $DATA_DIR \
+        $DUMP_WORK_DIR
+    python -m postprocessing.inactive_foxfooders $FOXFOOD_DIR \
+        $DATA_DIR/dogfood_details.csv
+else
+    python -m $PYTHON_MODULE $OUTPUT_DATA $DATA_DIR $FOXFOOD_DIR
+fi
+if [ "$AU_SQLITE_EXPORT" = "true" ]; then
+    python -m postprocessing.au_sqlite $DATA_DIR $WORK_DIR/$AU_SQLITE_FILE
+fi
 cd $DATA_DIR
 
 if [ ! "ls -1 | grep -q '\.csv$'" ]; then
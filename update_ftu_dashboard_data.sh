@@ -94,7 +94,20 @@ fi
 # At this point we should have the latest data. 
 echo "Processing data..."
 cd $SRC_DIR
-python -m $PYTHON_MODULE $OUTPUT_DATA $DASHBOARD_CSV_PATH $DUMP_CSV_PATH
+if [ "$FTU_INCREMENTAL" = "true" ]; then
+    # Update the dashboard from the store of previously processed dates.
+    # This fails if the job output leaves a gap after the dates in the store.
+    if ! python -m postprocessing.ftu_incremental $OUTPUT_DATA \
+            $WORK_DIR/$FTU_STORE_DIR_NAME \
+            $DASHBOARD_CSV_PATH $DUMP_CSV_PATH; then
+        echo "Incremental update failed."
+        echo "" | mailx -s "FAILED: FxOS FTU data - incremental update" \
+            "$ADDR@mozilla.com" 
+        exit 1
+    fi
+else
+    python -m $PYTHON_MODULE $OUTPUT_DATA $DASHBOARD_CSV_PATH $DUMP_CSV_PATH
+fi
     
 if [ ! -e "$DASHBOARD_CSV_PATH" ]; then
     echo "Something went wrong - no dashboard CSV file generated."
@@ -0,0 +1,69 @@
+"""
+A compact Bloom filter for testing membership of string keys, such as AU 
+payload identifiers.
+
+A filter is represented as a dict with the number of bits 'm', the number of 
+hash functions 'k', and the bit array 'bits' (a bytearray). Bit positions 
+for a key are derived from the MD5 digest of the key using double hashing.
+
+Lookups can return false positives (at a rate determined when the filter is 
+created) but never false negatives.
+"""
+
+import math
+import hashlib
+import struct
+
+
+def new_filter(n, fp_rate = 0.001):
+    """Create an empty filter sized to hold n keys with the given false 
+    positive rate.
+    """
+    n = max(n, 1)
+    m = int(math.ceil(-n * math.log(fp_rate) / math.log(2) ** 2))
+    k = max(int(round(float(m) / n * math.log(2))), 1)
+    return {'m': m, 'k': k, 'bits': bytearray((m + 7) // 8)}
+
+
+def bit_positions(bf, key):
+    """Compute the bit positions for a key."""
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    h1, h2 = struct.unpack('<QQ', hashlib.md5(key).digest())
+    m = bf['m']
+    return [(h1 + i * h2) % m for i in range(bf['k'])]
+
+
+def add(bf, key):
+    """Add a key to the filter."""
+    bits = bf['bits']
+    for pos in bit_positions(bf, key):
+        bits[pos >> 3] |= 1 << (pos & 7)
+
+
+def contains(bf, key):
+    """Test whether a key may be in the filter.
+    
+    False means that the key was definitely not added.
+    """
+    bits = bf['bits']
+    for pos in bit_positions(bf, key):
+        if not bits[pos >> 3] & (1 << (pos & 7)):
+            return False
+    return True
+
+
+def save(bf, path):
+    """Write the filter to a file: a header line with m and k, followed by
+    the raw bit array.
+    """
+    with open(path, 'wb') as outfile:
+        outfile.write('%s %s\n' % (bf['m'], bf['k']))
+        outfile.write(bf['bits'])
+
+
+def load(path):
+    """Load a filter written by save()."""
+    with open(path, 'rb') as infile:
+        m, k = [int(v) for v in infile.readline().split()]
+        return {'m': m, 'k': k, 'bits': bytearray(infile.read())}
@@ -0,0 +1,155 @@
+"""
+A column-oriented table for holding large numbers of rows with a fixed set of
+fields in memory.
+
+Storing rows as lists keeps a separate copy of every value for every row,
+even though most fields (device IDs, dates, OS versions, app URLs, etc) take
+only a small number of distinct values. Here, each column is stored as an
+array of machine integers instead. Integer fields are stored directly, and all
+other fields are dictionary-encoded: each distinct value is stored once, and
+the column holds the index of the value for each row. Dictionaries are keyed
+by field name, and can be shared between tables so that values such as
+device IDs are stored only once across all tables.
+
+Rows are appended and iterated over as lists, so the table can be used in
+place of a list of rows.
+"""
+
+import sys
+from array import array
+from itertools import izip
+
+# Placeholder stored in integer columns for missing ('') values.
+missing_int = -sys.maxint - 1
+
+# Number of rows to decode at a time when iterating.
+chunk_size = 10000
+
+
+class Dictionary(object):
+    """Dictionary encoding for the values of a field."""
+    
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+    
+    def encode(self, value):
+        """Return the integer code for a value, adding it if necessary."""
+        # Non-string values are keyed by type as well, so that eg. True and 1
+        # are kept distinct.
+        key = value if isinstance(value, basestring) else (type(value), value)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+    
+    def lookup(self, value):
+        """Return the integer code for a value, or None if it is not present."""
+        key = value if isinstance(value, basestring) else (type(value), value)
+        return self.codes.get(key)
+    
+    def __len__(self):
+        return len(self.values)
+
+
+class ColumnTable(object):
+    """Table of rows stored by column.
+    
+    The table has the given list of column names. Columns listed in
+    int_columns are stored as integers, and others are dictionary-encoded.
+    Dictionaries for encoded columns are looked up by column name in the dict
+    dictionaries, if given, and added to it otherwise.
+    
+    If a value other than an integer or '' is appended to an integer column,
+    the column is converted to dictionary encoding.
+    """
+    
+    def __init__(self, columns, int_columns = (), dictionaries = None):
+        if dictionaries is None:
+            dictionaries = {}
+        self.columns = list(columns)
+        self.dictionaries = dictionaries
+        # Column data arrays, and the dictionary for each column (None for
+        # integer columns).
+        self.data = []
+        self.encodings = []
+        for name in self.columns:
+            if name in int_columns:
+                self.data.append(array('l'))
+                self.encodings.append(None)
+            else:
+                self.data.append(array('i'))
+                self.encodings.append(dictionaries.setdefault(name,
+                    Dictionary()))
+        self.nrows = 0
+    
+    def append(self, row):
+        """Add a row, given as a sequence of values in column order."""
+        if len(row) != len(self.columns):
+            raise ValueError('Row has %s values for %s columns' %
+                (len(row), len(self.columns)))
+        for i, value in enumerate(row):
+            encoding = self.encodings[i]
+            if encoding is None:
+                if value == '':
+                    value = missing_int
+                elif (type(value) not in (int, long) or
+                        not missing_int < value <= sys.maxint):
+                    encoding = self.encode_column(i)
+            if encoding is not None:
+                value = encoding.encode(value)
+            self.data[i].append(value)
+        self.nrows += 1
+    
+    def encode_column(self, i):
+        """Convert an integer column to dictionary encoding."""
+        ints = self.data[i]
+        encoding = self.dictionaries.setdefault(self.columns[i], Dictionary())
+        self.data[i] = array('i', [encoding.encode('' if v == missing_int
+            else v) for v in ints])
+        self.encodings[i] = encoding
+        return encoding
+    
+    def decode(self, i, start = 0, stop = None):
+        """Return a list of the values in column i for the given row range."""
+        values = self.data[i][start:stop]
+        encoding = self.encodings[i]
+        if encoding is None:
+            return [('' if v == missing_int else v) for v in values]
+        decoded = encoding.values
+        return [decoded[c] for c in values]
+    
+    def codes(self, name):
+        """Return the stored array for the named column, and its dictionary.
+        
+        For integer columns, the dictionary is None and the array holds the 
+        values, with missing_int for missing values. Otherwise, the array 
+        holds the codes for the values in the dictionary.
+        """
+        i = self.columns.index(name)
+        return self.data[i], self.encodings[i]
+    
+    def row(self, index):
+        """Return the row at the given index as a list of values."""
+        return [self.decode(i, index, index + 1)[0] 
+            for i in range(len(self.columns))]
+    
+    def column(self, name):
+        """Return a list of the values in the named column."""
+        return self.decode(self.columns.index(name))
+    
+    def __len__(self):
+        return self.nrows
+    
+    def __iter__(self):
+        """Iterate over rows as lists of values.
+        
+        Rows are decoded a chunk at a time, one column at a time.
+        """
+        for start in xrange(0, self.nrows, chunk_size):
+            stop = start + chunk_size
+            columns = [self.decode(i, start, stop)
+                for i in range(len(self.columns))]
+            for row in izip(*columns):
+                yield list(row)
@@ -0,0 +1,103 @@
+"""
+Date windows restricting which records get processed, shared by the 
+map-reduce jobs and the postprocessing scripts.
+
+Each window is specified as a number of days before today, or None to 
+include all available history (back to the earliest date for the job). 
+Records are restricted by submission date, and optionally by the date the 
+ping was recorded on the device. The jobs drop records outside the window 
+before doing any parsing, counting them instead, and the submission date 
+window also determines the start date in the job filter.
+
+For incremental processing, jobs only cover the last few submission dates.
+These overlap with the previous run, so that the partially complete latest 
+date gets reprocessed. If a run is missed, the next job will not reach back 
+far enough, so incremental updates check for skipped dates using 
+missing_dates(), and fail rather than leave a gap in the processed data.
+
+Running this module prints the filter start date for a job, eg.
+    python -m utils.date_window ftu [--incremental]
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+
+# Window sizes in days for each job, the earliest submission date to 
+# use when a job has no submission date window, and the number of days to 
+# cover in incremental mode.
+windows = {
+    'ftu': {
+        'submission_days': 180,
+        'ping_days': None,
+        'earliest': '20140401',
+        'incremental_days': 2
+    },
+    'au': {
+        'submission_days': None,
+        'ping_days': None,
+        'earliest': '20150101',
+        'incremental_days': 2
+    }
+}
+
+
+def window_start(ndays, today = None):
+    """Return the earliest date included in a window covering the given 
+    number of days before today, or None if there is no window.
+    """
+    if ndays is None:
+        return None
+    if today is None:
+        today = date.today()
+    return today - timedelta(days = ndays)
+
+
+def get_window_dates(job, today = None):
+    """Return the earliest submission and ping dates to be included for the 
+    given job, as ISO-formatted strings, or None where there is no window.
+    """
+    w = windows[job]
+    dates = []
+    for k in 'submission_days', 'ping_days':
+        start = window_start(w[k], today)
+        dates.append(start.isoformat() if start is not None else None)
+    return tuple(dates)
+
+
+def filter_start_date(job, today = None, incremental = False):
+    """Return the start date for the job filter, formatted as yyyymmdd.
+    
+    If incremental is True, the filter covers only the most recent dates.
+    """
+    ndays = windows[job]['incremental_days' if incremental 
+        else 'submission_days']
+    start = window_start(ndays, today)
+    if start is None:
+        return windows[job]['earliest']
+    return start.strftime('%Y%m%d')
+
+
+def missing_dates(processed_dates, new_dates):
+    """Return the list of dates falling between the latest of the dates 
+    already processed and the earliest of the dates in new data, as 
+    ISO-formatted strings.
+    
+    For incremental processing, these are the dates that would be left out 
+    if the new data were added, eg. because a run was missed and the 
+    incremental job did not reach back far enough. The list is empty if 
+    either set of dates is empty.
+    """
+    if not processed_dates or not new_dates:
+        return []
+    latest = datetime.strptime(max(processed_dates), '%Y-%m-%d').date()
+    earliest_new = datetime.strptime(min(new_dates), '%Y-%m-%d').date()
+    return [(latest + timedelta(days = d)).isoformat() 
+        for d in range(1, (earliest_new - latest).days)]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in windows:
+        sys.exit(2)
+    print(filter_start_date(sys.argv[1], 
+        incremental = '--incremental' in sys.argv[2:]))
+    sys.exit(0)
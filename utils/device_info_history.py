@@ -0,0 +1,145 @@
+"""
+Queryable table of the device info history for foxfood devices.
+
+The history for each device is stored run-length encoded: the value of each
+device info field for the device's first payload, followed by only the fields
+which changed, with the start timestamp of the payload where the change was
+first seen (see device_info_history() in utils/dogfood_summary.py). This is
+written out as the dogfood_history table.
+
+The rows are held in a column table (see utils/column_table.py), so that
+device IDs, field names and values are dictionary-encoded. Since rows are 
+added a device at a time, the ranges of rows for each device are recorded as 
+they are added, and looking up a device only visits its own rows. Filtering 
+by field compares integer codes, using NumPy if available.
+"""
+
+import csv
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import dump_schema as schema
+from column_table import ColumnTable
+
+
+class DeviceInfoHistory(object):
+    """Run-length device info history for a collection of devices.
+    
+    Rows are (deviceID, start timestamp, field, value), as in the
+    dogfood_history table, and must be added in chronological order for each
+    device.
+    """
+    
+    def __init__(self, dictionaries = None):
+        self.table = ColumnTable(schema.au_dogfood_history_csv,
+            ['start_timestamp'], dictionaries)
+        # Mapping of device ID codes to the [start, stop) ranges of their row
+        # indices. There is a single range for each device unless its rows 
+        # were added in several batches.
+        self.device_ranges = defaultdict(list)
+    
+    def add(self, device_id, history):
+        """Add the history for a device, as a list of (start timestamp, field,
+        value) triples.
+        """
+        for start, field, value in history:
+            self.append([device_id, start, field, value])
+    
+    def append(self, row):
+        """Add a single row of the dogfood_history table."""
+        self.table.append(row)
+        index = len(self.table) - 1
+        device_codes, encoding = self.table.codes('deviceID')
+        ranges = self.device_ranges[device_codes[index]]
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    
+    def __len__(self):
+        return len(self.table)
+    
+    def __iter__(self):
+        return iter(self.table)
+    
+    def row_indices(self, device_id = None, field = None):
+        """Return the indices of the rows for the given device and/or field, 
+        in the order they were added.
+        """
+        if device_id is None:
+            indices = None
+        else:
+            device_codes, encoding = self.table.codes('deviceID')
+            code = encoding.lookup(device_id)
+            if code is None:
+                return []
+            indices = []
+            for start, stop in self.device_ranges[code]:
+                indices.extend(xrange(start, stop))
+        if field is None:
+            return xrange(len(self.table)) if indices is None else indices
+        field_codes, encoding = self.table.codes('field')
+        code = encoding.lookup(field)
+        if code is None:
+            return []
+        if indices is None:
+            if np is not None and len(field_codes):
+                field_codes = np.frombuffer(field_codes, 
+                    dtype='i%s' % field_codes.itemsize)
+                return np.flatnonzero(field_codes == code).tolist()
+            indices = xrange(len(self.table))
+        return [i for i in indices if field_codes[i] == code]
+    
+    def rows(self, device_id = None, field = None):
+        """Iterate over the rows for the given device and/or field, in the
+        order they were added.
+        """
+        if device_id is None and field is None:
+            for row in self.table:
+                yield row
+            return
+        for index in self.row_indices(device_id, field):
+            yield self.table.row(index)
+    
+    def info_at(self, device_id, timestamp):
+        """Return a dict of the device info fields for a device as of the
+        given timestamp. This is empty if the timestamp is before the device's
+        first payload.
+        """
+        info = {}
+        for row in self.rows(device_id = device_id):
+            if row[1] > timestamp:
+                break
+            info[row[2]] = row[3]
+        return info
+    
+    def transitions(self, field):
+        """Iterate over the changes to the given field for all devices.
+        
+        Yields tuples of (deviceID, start timestamp, previous value, new
+        value). The initial value for each device is not included.
+        """
+        previous = {}
+        for device_id, start, name, value in self.rows(field = field):
+            if device_id in previous:
+                yield device_id, start, previous[device_id], value
+            previous[device_id] = value
+
+
+def read_history_csv(path):
+    """Load a dogfood_history CSV into a DeviceInfoHistory."""
+    history = DeviceInfoHistory()
+    with open(path) as infile:
+        reader = csv.reader(infile)
+        headers = reader.next()
+        if headers != schema.au_dogfood_history_csv:
+            raise ValueError('Unexpected columns in %s' % path)
+        for row in reader:
+            row = [v.decode('utf-8') for v in row]
+            row[1] = int(row[1])
+            history.append(row)
+    return history
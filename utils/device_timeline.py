@@ -0,0 +1,194 @@
+"""
+A timeline of the AU pings from a single device, identified by their 
+(start, stop) recording times.
+
+The timeline classifies pings according to how their time ranges relate to 
+the previous pings (clock skew, nesting, overlap), and retains the sanitized 
+sequence of pings. The retained pings are held in sorted arrays of start and 
+stop times, together with a hash index for constant-time membership checks. 
+Classification is O(n log n) in the number of pings, dominated by the sort.
+
+If NumPy is available, classify_devices() can instead classify the pings for 
+all devices at once using array operations.
+"""
+
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Tolerance for overlap: 5 seconds.
+overlap_tolerance = 5000
+
+# Conditions recorded during classification.
+ping_conditions = ['clockskew', 'nested', 'overlap', 'negligibleoverlap']
+
+
+class DeviceTimeline(object):
+    """Collection of (start, stop) ping times for a device."""
+    
+    def __init__(self, pings = ()):
+        self.pings = list(pings)
+        self.starts = []
+        self.stops = []
+        self.index = set()
+    
+    def add(self, start, stop):
+        """Add a ping. The timeline needs to be reclassified afterwards."""
+        self.pings.append((start, stop))
+    
+    def classify(self, tolerance = overlap_tolerance):
+        """Sort the pings and identify which should be kept.
+        
+        Ping times should be sequential: previous stop time no later than 
+        current start time. Pings with start time later than stop time are 
+        removed (clock skew), as are ping time ranges completely contained in 
+        the previous retained ping ("nested"). Otherwise, we may have 
+        non-trivial overlapping time ranges (a bug condition). In this case, 
+        the ping is kept, but the occurrence is noted. Overlaps shorter than 
+        the tolerance (in ms) are noted separately as negligible.
+        
+        Returns a dict mapping conditions to the number of pings they 
+        occurred for.
+        """
+        counts = {}
+        starts = []
+        stops = []
+        # Sort by increasing start time and then by increasing stop time.
+        self.pings.sort()
+        for start, stop in self.pings:
+            condition = None
+            if start > stop:
+                # Means either a bug or system time was changed.
+                condition = 'clockskew'
+            elif stops and start < stops[-1]:
+                # There is some overlap with the last retained ping.
+                last_stop = stops[-1]
+                if stop <= last_stop:
+                    condition = 'nested'
+                elif last_stop - start < tolerance:
+                    condition = 'negligibleoverlap'
+                else:
+                    condition = 'overlap'
+            if condition is not None:
+                counts[condition] = counts.get(condition, 0) + 1
+            if condition not in ('clockskew', 'nested'):
+                starts.append(start)
+                stops.append(stop)
+        if not starts:
+            # If no pings were retained, keep them all rather than none.
+            starts = [p[0] for p in self.pings]
+            stops = [p[1] for p in self.pings]
+        self.retain(starts, stops)
+        return counts
+    
+    def retain(self, starts, stops):
+        """Set the retained pings from sorted lists of start and stop times."""
+        self.starts = starts
+        self.stops = stops
+        self.index = set(zip(starts, stops))
+    
+    def __contains__(self, ping):
+        """Check whether a (start, stop) ping was retained."""
+        return ping in self.index
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def __iter__(self):
+        return iter(zip(self.starts, self.stops))
+    
+    def pings_between(self, t0, t1):
+        """Return the retained pings starting in the interval [t0, t1]."""
+        i = bisect_left(self.starts, t0)
+        j = bisect_right(self.starts, t1)
+        return zip(self.starts[i:j], self.stops[i:j])
+
+
+def classify_devices(device_ids, starts, stops, tolerance = overlap_tolerance):
+    """Classify the pings for all devices at once using NumPy.
+    
+    The inputs are parallel sequences of device ID, start and stop time for 
+    each ping. Pings are sorted by (device, start, stop), matching the order 
+    used by DeviceTimeline.classify(). The last retained stop time before 
+    each ping is the running maximum of the stop times of the previous pings 
+    for the device, excluding those with clock skew (nested pings never 
+    raise the maximum, and any other retained ping does). This is computed 
+    for all devices in a single cumulative max by offsetting the ranks of 
+    the stop times by device.
+    
+    Returns a dict mapping device IDs to DeviceTimelines holding their 
+    retained pings, and a dict mapping conditions to dicts of per-device ping 
+    counts. These are the same as obtained by calling 
+    DeviceTimeline.classify() for each device.
+    """
+    if np is None:
+        raise ImportError('classify_devices() requires NumPy')
+    timelines = {}
+    counts = {}
+    if not len(device_ids):
+        return timelines, counts
+    # Integer group index for each device, in order of first occurrence.
+    # This is quicker than sorting the device IDs.
+    group_index = {}
+    groups = np.array([group_index.setdefault(d, len(group_index)) 
+        for d in device_ids], dtype=np.int64)
+    devices = [None] * len(group_index)
+    for d, g in group_index.iteritems():
+        devices[g] = d
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    order = np.lexsort((stops, starts, groups))
+    groups = groups[order]
+    starts = starts[order]
+    stops = stops[order]
+    
+    clockskew = starts > stops
+    # Rank stop times from 1, and use 0 to mask pings with clock skew.
+    stop_values, stop_ranks = np.unique(stops, return_inverse=True)
+    stop_ranks = np.where(clockskew, 0, stop_ranks + 1)
+    # Running max of ranks within each device, offset by device so that 
+    # the max never carries over from the previous device.
+    offset = groups * (len(stop_values) + 1)
+    running_max = np.maximum.accumulate(offset + stop_ranks)
+    # Shift to get the max over the previous pings only.
+    prev_ranks = np.empty_like(running_max)
+    prev_ranks[0] = -1
+    prev_ranks[1:] = running_max[:-1]
+    prev_ranks -= offset
+    has_prev = prev_ranks > 0
+    last_stops = stop_values[np.maximum(prev_ranks, 1) - 1]
+    
+    overlapping = ~clockskew & has_prev & (starts < last_stops)
+    nested = overlapping & (stops <= last_stops)
+    overlapping &= ~nested
+    negligible = overlapping & (last_stops - starts < tolerance)
+    conditions = {
+        'clockskew': clockskew,
+        'nested': nested,
+        'overlap': overlapping & ~negligible,
+        'negligibleoverlap': negligible
+    }
+    for condition in ping_conditions:
+        group_counts = np.bincount(groups[conditions[condition]], 
+            minlength=len(devices))
+        for g in np.flatnonzero(group_counts):
+            counts.setdefault(condition, {})[devices[g]] = int(group_counts[g])
+    
+    kept = ~clockskew & ~nested
+    # If no pings were retained for a device, keep them all rather than none.
+    kept |= (np.bincount(groups[kept], minlength=len(devices)) == 0)[groups]
+    
+    # Build the timelines, splitting the sorted arrays by device.
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(groups)) + 1, 
+        [len(groups)]))
+    for g in range(len(bounds) - 1):
+        i, j = bounds[g], bounds[g + 1]
+        group_kept = kept[i:j]
+        timeline = DeviceTimeline()
+        timeline.retain(starts[i:j][group_kept].tolist(), 
+            stops[i:j][group_kept].tolist())
+        timelines[devices[groups[i]]] = timeline
+    return timelines, counts
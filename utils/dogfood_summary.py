@@ -0,0 +1,296 @@
+"""
+Summaries of the AU data for individual foxfood devices.
+
+The device info and app usage rows for each device are aggregated into the
+rows of the dogfood_details, dogfood_history and dogfood_appusage tables. 
+This is used in postprocessing (postprocessing/au_data_tables.py and 
+au_external_sort.py), and by the reducer in the variant of the AU job keyed 
+by device (awsjobs/dump_format_appusage_bydevice.py).
+
+If NumPy is available, app usage for all devices can instead be aggregated at
+once from the column table of app rows using array operations (see 
+aggregate_app_table()).
+"""
+
+from collections import defaultdict, Counter
+from itertools import izip
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import dump_schema as schema
+from device_timeline import DeviceTimeline
+from column_table import missing_int
+
+# Names of the device info fields, from 'os' to 'developer.menu.enabled' in 
+# au_device_info_keys, as in the dogfood details table.
+device_info_fields = schema.au_info_csv[6:-1]
+
+
+def device_info_history(payloads):
+    """Compute the run-length history of device info for a device.
+    
+    The payloads are the info rows for the device (with deviceID removed), 
+    sorted chronologically. The history is a list of (start timestamp, field
+    name, value) triples, giving all fields for the first payload, followed by
+    only the fields which changed from the previous payload.
+    """
+    info = payloads[0][5:]
+    history = [(payloads[0][0], field, value)
+        for field, value in zip(device_info_fields, info)]
+    for p in payloads[1:]:
+        newinfo = p[5:]
+        if newinfo == info:
+            continue
+        for i, value in enumerate(newinfo):
+            if value != info[i]:
+                history.append((p[0], device_info_fields[i], value))
+        info = newinfo
+    return history
+
+
+def summarize_devices(partition):
+    """Summarize device info and app usage for a collection of devices.
+    
+    The partition is a pair of mappings of device IDs to their info rows and 
+    their app rows (with deviceID and dogfood flag removed). Returns mappings
+    of device IDs to device details and to app usage by (app URL, date).
+    """
+    dogfood_info, dogfood_app = partition
+    # Summparize device info and app usage for each dogfooding device.
+    dogfood_details = {}
+    for device_id, payloads in dogfood_info.iteritems():
+        device_details = {}
+        # Sort by all fields, which sorts first by start then by stop times 
+        # (ie chronologically), and then by values of other fields.
+        payloads.sort()
+        # Record changes to the device info fields, and store the full 
+        # latest device info.
+        history = device_info_history(payloads)
+        device_details['history'] = history
+        device_details['info'] = payloads[-1][5:]
+        # Earliest and latest measurement ranges.
+        device_details['earliest_start'] = payloads[0][0]
+        device_details['latest_stop'] = payloads[-1][1]
+        # Earliest and latest ping submission dates.
+        submission_dates = [p[2] for p in payloads]
+        device_details['earliest_submission'] = min(submission_dates)
+        device_details['latest_submission'] = max(submission_dates)
+        device_details['num_pings'] = len(payloads)
+        device_details['changed_info'] = (
+            len(history) > len(device_info_fields))
+        device_details['earliest_appusage'] = ''
+        device_details['latest_appusage'] = ''
+        dogfood_details[device_id] = device_details
+    
+    dogfood_appusage = {}
+    for device_id, payloads in dogfood_app.iteritems():
+        dogfood_appusage[device_id] = aggregate_app_usage(payloads)
+    # Add app usage dates summary to dogfood_details.
+    add_app_usage_dates(dogfood_details, dogfood_appusage)
+    
+    return dogfood_details, dogfood_appusage
+
+
+def format_app_usage(counts, addon_flags, activities):
+    """Format the aggregated usage for an app and date as a list of strings: 
+    the six counts, the addon flags and the activity counts.
+    """
+    return map(str, counts) + format_app_flags(addon_flags, activities)
+
+
+def format_app_flags(addon_flags, activities):
+    """Format the addon flags and activity counts for an app and date."""
+    # These are usually empty.
+    return [
+        ';'.join(map(str, sorted(addon_flags))) if addon_flags else '',
+        ';'.join(sorted(['%s:%s' % x for x in activities.iteritems()])) 
+            if activities else ''
+    ]
+
+
+def aggregate_app_usage(payloads):
+    """Aggregate the app rows for a device by (app URL, usage date).
+    
+    Returns a dict mapping (app URL, date) to a list of values formatted by 
+    format_app_usage().
+    """
+    app_data = {}
+    for p in payloads:
+        # App rows are identified by app URL and usage date.
+        app_key = (p[2], p[3])
+        if app_key not in app_data:
+            # Add a new record.
+            # Store values in a dict for convenient aggregation, and 
+            # convert to strings at the end.
+            app_data[app_key] = {
+                'counts': [0, 0, 0, 0, 0, 0],
+                # Maintain set of unique addon flag values seen for this app
+                # and date. Should be either empty or a single value.
+                'addon_flag': set(),
+                # Maintain a mapping of activity identifiers to counts.
+                'activities': Counter()
+            }
+        for i in range(6):
+            # Add in new numerical values.
+            if p[4+i]:
+                app_data[app_key]['counts'][i] += p[4+i]
+        if p[10] != '':
+            app_data[app_key]['addon_flag'].add(p[10])
+        if p[11]:
+            # If we have activity counts, increment.
+            activities = app_data[app_key]['activities']
+            for activity, n in p[11]:
+                activities[activity] += n
+    # Convert app data values to strings.
+    for app_key, vals in app_data.iteritems():
+        app_data[app_key] = format_app_usage(vals['counts'], 
+            vals['addon_flag'], vals['activities'])
+    return app_data
+
+
+def aggregate_app_table(table, rows):
+    """Aggregate app usage for the given rows of a column table of app rows 
+    (see utils/column_table.py) using NumPy.
+    
+    The rows are given as an array of row indices in table order. Rows are 
+    grouped by (deviceID, app URL, date), encoded as a single integer key from
+    the dictionary codes for each field, and the six count columns are summed
+    for all groups together with a sort-based reduction. Addon flags and 
+    activities are only present on some rows, so these are collected for 
+    those rows and merged once for each group.
+    
+    Returns a dict mapping device IDs to dicts as returned by 
+    aggregate_app_usage(), with the same contents (and keys inserted in the 
+    same order). Returns None if a count column holds values other than 
+    integers, in which case the rows should be aggregated by 
+    aggregate_app_usage().
+    """
+    if np is None:
+        raise ImportError('aggregate_app_table() requires NumPy')
+    dogfood_appusage = {}
+    if not len(rows):
+        return dogfood_appusage
+    
+    counts = []
+    for name in schema.au_app_data_keys[2:8]:
+        values, encoding = table.codes(name)
+        if encoding is not None:
+            return None
+        values = np.frombuffer(values, dtype='i%s' % values.itemsize)[rows]
+        counts.append(np.where(values == missing_int, 0, values))
+    counts = np.column_stack(counts)
+    
+    fields = []
+    for name in ['deviceID', 'appurl', 'date', 'addOn', 'activities']:
+        values, encoding = table.codes(name)
+        fields.append((np.frombuffer(values, 
+            dtype='i%s' % values.itemsize)[rows], encoding.values))
+    (devices, device_ids), (apps, app_urls), (dates, date_values) = fields[:3]
+    keys = ((devices.astype(np.int64) * len(app_urls) + apps) * 
+        len(date_values) + dates)
+    # Sort stably, so that the first row of each group comes first.
+    order = np.argsort(keys, kind='mergesort')
+    sorted_keys = keys[order]
+    steps = np.diff(sorted_keys) != 0
+    bounds = np.concatenate(([0], np.flatnonzero(steps) + 1))
+    sums = map(str, np.add.reduceat(counts[order], bounds, axis=0).ravel(
+        ).tolist())
+    # Group index for each row.
+    groups = np.empty(len(rows), dtype=np.int64)
+    groups[order] = np.cumsum(np.concatenate(([0], steps)))
+    
+    addon_flags = defaultdict(set)
+    flags, flag_values = fields[3]
+    nonempty = np.array([v != '' for v in flag_values], dtype=bool)[flags]
+    for g, code in izip(groups[nonempty].tolist(), flags[nonempty].tolist()):
+        addon_flags[g].add(flag_values[code])
+    activities = defaultdict(Counter)
+    acts, act_values = fields[4]
+    nonempty = np.array([bool(v) for v in act_values], dtype=bool)[acts]
+    for g, code in izip(groups[nonempty].tolist(), acts[nonempty].tolist()):
+        group_activities = activities[g]
+        for activity, n in act_values[code]:
+            group_activities[activity] += n
+    
+    # Output groups in order of first occurrence.
+    first_rows = order[bounds]
+    group_order = np.argsort(first_rows).tolist()
+    first_rows = first_rows.tolist()
+    devices = devices.tolist()
+    apps = apps.tolist()
+    dates = dates.tolist()
+    no_flags = ['', '']
+    for g in group_order:
+        first = first_rows[g]
+        device_id = device_ids[devices[first]]
+        app_data = dogfood_appusage.get(device_id)
+        if app_data is None:
+            app_data = dogfood_appusage[device_id] = {}
+        values = sums[6 * g:6 * g + 6]
+        if g in addon_flags or g in activities:
+            values += format_app_flags(addon_flags.get(g, ()), 
+                activities.get(g, {}))
+        else:
+            values += no_flags
+        app_data[(app_urls[apps[first]], date_values[dates[first]])] = values
+    return dogfood_appusage
+
+
+def add_app_usage_dates(dogfood_details, dogfood_appusage):
+    """Add the earliest and latest app usage dates to the device details."""
+    for device_id, app_data in dogfood_appusage.iteritems():
+        usage_dates = [k[1] for k in app_data]
+        dogfood_details[device_id]['earliest_appusage'] = min(usage_dates)
+        dogfood_details[device_id]['latest_appusage'] = max(usage_dates)
+
+
+def dogfood_details_row(device_id, vals):
+    """Format the details for a foxfood device as a CSV row."""
+    row = [device_id]
+    row += [vals[k] for k in schema.au_dogfood_details_csv[1:9]]
+    row += vals['info']
+    return row
+
+
+def dogfood_history_rows(device_id, vals):
+    """Format the device info history for a foxfood device as a list of CSV 
+    rows.
+    """
+    return [[device_id] + list(change) for change in vals['history']]
+
+
+def dogfood_appusage_rows(device_id, app_rows):
+    """Format the app usage for a foxfood device as a list of CSV rows."""
+    return [[device_id] + list(app_key) + vals 
+        for app_key, vals in app_rows.iteritems()]
+
+
+def summarize_device(device_id, info_rows, app_rows):
+    """Classify the pings for a single device, and summarize the device if it
+    is a foxfood device.
+    
+    The info and app rows are the full table rows for the device. Returns a 
+    dict of counts of ping conditions (see utils/device_timeline.py), the 
+    dogfooding flag from the first info row, the number of info rows whose 
+    dogfooding flag is inconsistent with the first, and the device details 
+    and app usage as computed by summarize_devices() (or None if it is not 
+    a foxfood device).
+    """
+    is_dogfood = info_rows[0][-1]
+    inconsistent = len([row for row in info_rows if row[-1] != is_dogfood])
+    timeline = DeviceTimeline([(row[1], row[2]) for row in info_rows])
+    counts = timeline.classify()
+    if not is_dogfood:
+        return counts, is_dogfood, inconsistent, None
+    
+    # Drop deviceID from the beginning and dogfood flag from the end.
+    dogfood_info = [row[1:-1] for row in info_rows
+        if (row[1], row[2]) in timeline]
+    dogfood_app = [row[1:-1] for row in app_rows
+        if (row[1], row[2]) in timeline]
+    summary = summarize_devices(({device_id: dogfood_info},
+        {device_id: dogfood_app} if dogfood_app else {}))
+    return counts, is_dogfood, inconsistent, summary
@@ -179,6 +179,26 @@ au_search_count_keys = [
     'dogfood'
 ]
     
+# Fields in the AU tables that hold integer values (or '' if missing).
+au_int_keys = [
+    'start',
+    'stop',
+    'usageTime',
+    'invocations',
+    'installs',
+    'uninstalls',
+    'enables',
+    'disables',
+    'count'
+]
+
+# The fields in each of the AU tables outputted by the job, with the ping 
+# identifier fields first.
+au_table_keys = {
+    'info': au_ping_identifier_keys + au_device_info_keys,
+    'app': au_ping_identifier_keys + au_app_data_keys,
+    'search': au_ping_identifier_keys + au_search_count_keys
+}
 
 # au_active_date_keys = [
     # 'type',
@@ -265,6 +285,17 @@ au_dogfood_details_csv = [
     'num_pings',
     'changed_info' ] + au_info_csv[6:-1]
 
+# Run-length history of device info for foxfood devices: each row gives the
+# value of a device info field (named as in au_info_csv) as of the start 
+# timestamp of a payload, recorded only when it changed from the previous 
+# payload.
+au_dogfood_history_csv = [
+    'deviceID',
+    'start_timestamp',
+    'field',
+    'value'
+]
+
 au_dogfood_appusage_csv = [
     'deviceID',
     'app_url',
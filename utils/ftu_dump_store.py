@@ -0,0 +1,171 @@
+"""
+On-disk store of FTU dump rows, partitioned by submission date and stored by
+column.
+
+Each submission date is stored as a single compressed chunk file holding the
+rows for that date as a column table (see utils/column_table.py): each column
+is written as an array of integer codes, together with the list of distinct
+values for dictionary-encoded columns. A small JSON index file lists the
+dates in the store with their row counts, so that reading a date range only
+opens the chunks for the dates in that range.
+
+Chunk layout (zlib-compressed):
+- a JSON header line giving the row count, the byte order, and for each
+  column its name, array typecode and itemsize, and its dictionary values
+  (null for integer columns)
+- the raw bytes of the array for each column, in column order.
+
+Chunks and the index are written to temporary files and then moved into
+place, so that an interrupted update leaves the previous versions intact.
+"""
+
+import os
+import os.path
+import sys
+import json
+import zlib
+from array import array
+
+import dump_schema as schema
+from column_table import ColumnTable, Dictionary
+
+index_file = 'index.json'
+chunk_suffix = '.chunk'
+
+# Columns stored as integers rather than dictionary-encoded.
+int_columns = ['count']
+
+
+def replace_file(path, contents):
+    """Write contents to path via a temporary file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as outfile:
+        outfile.write(contents)
+    os.rename(tmp_path, path)
+
+
+def encode_chunk(table):
+    """Serialize a column table as a compressed chunk."""
+    header = {
+        'nrows': len(table),
+        'byteorder': sys.byteorder,
+        'columns': []
+    }
+    data = []
+    for name, values, encoding in zip(table.columns, table.data,
+            table.encodings):
+        header['columns'].append({
+            'name': name,
+            'typecode': values.typecode,
+            'itemsize': values.itemsize,
+            'values': encoding.values if encoding is not None else None
+        })
+        data.append(values.tostring())
+    return zlib.compress(json.dumps(header) + '\n' + ''.join(data))
+
+
+def decode_chunk(contents):
+    """Load a column table from a compressed chunk."""
+    contents = zlib.decompress(contents)
+    header_end = contents.index('\n')
+    header = json.loads(contents[:header_end])
+    table = ColumnTable([c['name'] for c in header['columns']],
+        [c['name'] for c in header['columns'] if c['values'] is None])
+    offset = header_end + 1
+    for i, c in enumerate(header['columns']):
+        values = array(c['typecode'])
+        if values.itemsize != c['itemsize']:
+            raise ValueError('Cannot read %s-byte values for column %s' %
+                (c['itemsize'], c['name']))
+        nbytes = header['nrows'] * values.itemsize
+        values.fromstring(contents[offset:offset + nbytes])
+        offset += nbytes
+        if header['byteorder'] != sys.byteorder:
+            values.byteswap()
+        table.data[i] = values
+        if c['values'] is not None:
+            encoding = Dictionary()
+            for v in c['values']:
+                encoding.encode(v)
+            table.encodings[i] = encoding
+    table.nrows = header['nrows']
+    return table
+
+
+class DumpStore(object):
+    """Date-partitioned columnar store of FTU dump rows.
+
+    Rows are lists of values for the columns in schema.dump_csv_headers, ie.
+    the fields in schema.final_keys followed by the count. Changes to the
+    partitions are only recorded in the index once save_index() is called.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.columns = list(schema.dump_csv_headers)
+        # Mapping of partition dates to row counts.
+        self.partitions = {}
+        path = os.path.join(store_dir, index_file)
+        if os.path.exists(path):
+            with open(path) as infile:
+                index = json.load(infile)
+            if index['columns'] != self.columns:
+                raise ValueError('Unexpected columns in dump store %s' %
+                    store_dir)
+            self.partitions = index['partitions']
+
+    def chunk_path(self, date):
+        return os.path.join(self.store_dir, date + chunk_suffix)
+
+    def dates(self, start = None, stop = None):
+        """Return the sorted list of partition dates, optionally restricted
+        to those between start and stop inclusive.
+        """
+        return sorted([d for d in self.partitions
+            if (start is None or d >= start) and (stop is None or d <= stop)])
+
+    def nrows(self, start = None, stop = None):
+        """Return the number of rows in the partitions between start and stop
+        inclusive, using the index only.
+        """
+        return sum([self.partitions[d] for d in self.dates(start, stop)])
+
+    def new_partition(self):
+        """Return an empty column table to hold the rows for a partition."""
+        return ColumnTable(self.columns, int_columns)
+
+    def write_partition(self, date, table):
+        """Write the rows for a date, replacing any existing partition."""
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+        replace_file(self.chunk_path(date), encode_chunk(table))
+        self.partitions[date] = len(table)
+
+    def read_partition(self, date):
+        """Load the rows for a date as a column table."""
+        with open(self.chunk_path(date), 'rb') as infile:
+            return decode_chunk(infile.read())
+
+    def remove_partition(self, date):
+        """Delete the partition for a date."""
+        path = self.chunk_path(date)
+        if os.path.exists(path):
+            os.remove(path)
+        self.partitions.pop(date, None)
+
+    def iter_rows(self, start = None, stop = None):
+        """Iterate over the rows submitted between start and stop inclusive,
+        in order of date. Only the partitions in the range are read.
+        """
+        for date in self.dates(start, stop):
+            for row in self.read_partition(date):
+                yield row
+
+    def save_index(self):
+        """Record the current set of partitions in the index file."""
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+        replace_file(os.path.join(self.store_dir, index_file), json.dumps({
+            'columns': self.columns,
+            'partitions': self.partitions
+        }, indent = 2, sort_keys = True))
@@ -51,6 +51,12 @@ def load_whitelist():
     lookup['countrylist'] = set(tables['country'])
     # Device table contains string prefixes. Convert to tuple. 
     lookup['devicelist'] = tuple(tables['device'])
+    # Also index the prefixes by length, so that a name can be checked with 
+    # one set probe per distinct prefix length.
+    prefixes = {}
+    for prefix in lookup['devicelist']:
+        prefixes.setdefault(len(prefix), set()).add(prefix)
+    lookup['deviceprefixes'] = sorted(prefixes.items())
     # Operator table will be a set.
     lookup['operatorlist'] = set(tables['operator'])
 
@@ -274,10 +280,11 @@ def summarize_device(val):
         return 'Unknown'
     
     # Don't keep distinct name if does not start with recognized prefix.
-    if not val.startswith(lookup['devicelist']): 
-        return 'Other'
-        
-    return val
+    for n, prefixes in lookup['deviceprefixes']:
+        if val[:n] in prefixes:
+            return val
+    
+    return 'Other'
 
 
 def summarize_country(val):
@@ -321,9 +328,6 @@ def summarize_operator(icc_network, icc_name, network_network, network_name):
     replaced with 'Unknown' if it is missing, or 'Other' if it is not in the 
     list.
     """
-    if 'operatorlist' not in lookup:
-        load_whitelist()
-    
     # Determine operator based on information first from SIM card,
     # then from network. 
     network_vals = [icc_network, icc_name, network_network, network_name]
@@ -333,6 +337,16 @@ def summarize_operator(icc_network, icc_name, network_network, network_name):
             operator = v
             break
     
+    return summarize_operator_name(operator)
+
+
+def summarize_operator_name(operator):
+    """Convert an operator name, as selected by summarize_operator(), to a 
+    value to be displayed in dashboard.
+    """
+    if 'operatorlist' not in lookup:
+        load_whitelist()
+    
     if operator == '':
         return 'Unknown'
         
@@ -13,7 +13,9 @@ tuples with a specified ordering. Currently only the tuple approach is in use.
 The functions provide shortcuts for outputting a collection of data values, 
 incrementing counters, and counting occurrences of special conditions
 identified by simple strings. There is also a parsing function for 
-reconstituting the tuple-based map-reduce output back into dicts.
+reconstituting the tuple-based map-reduce output back into dicts, and an 
+iterator over the output records for processing them without loading them all
+at once.
 
 A simple summing reduce function is also defined here, for convenience.
 """
@@ -121,28 +123,19 @@ def write_condition_tuple(context, condition):
     context.write(('condition', condition), 1)
 
 
-def parse_output_tuple(output_file):
-    """Parse back the output of a map-reduce job recorded using tuples.
-    
-    Read in output file containing one output record per line. Separate 
-    records, conditions and counters.
+def iter_output_tuple(output_file, data):
+    """Iterate over the data records in the output of a map-reduce job 
+    recorded using tuples.
     
-    Records will be returned as lists with the entire value appended at the 
-    end as a string. If the value is a count, it will need to be converted 
-    to numeric. If the value is a list, the entire list will be represented
-    as a single string (the result of calling str()) on it.
-    
-    The ordering of the fields in the key and value is determined by the 
-    schema that was used in writing the tuples.
+    Read in output file containing one output record per line. Conditions and
+    counters are stored in the dict data under the keys 'conditions' and 
+    'counters' as they are encountered, in the same format as for 
+    parse_output_tuple().
     
-    Output is a map with keys 'records', 'counters', 'conditions'.
+    Data records are yielded one at a time as a pair: the list of key fields 
+    (with the type identifier removed), and the unparsed value string. This 
+    avoids holding all the records in memory at once.
     """
-    # Initialize storage. 
-    data = {}
-    data['records'] = []
-    data['counters'] = {}
-    data['conditions'] = {}
-    
     # Parse records line by line.
     for row in open(output_file):
         # Split the row into key and value.
@@ -176,6 +169,32 @@ def parse_output_tuple(output_file):
             continue
         
         # Otherwise we a have a data record.
+        yield vals, record_value
+
+
+def parse_output_tuple(output_file):
+    """Parse back the output of a map-reduce job recorded using tuples.
+    
+    Read in output file containing one output record per line. Separate 
+    records, conditions and counters.
+    
+    Records will be returned as lists with the entire value appended at the 
+    end as a string. If the value is a count, it will need to be converted 
+    to numeric. If the value is a list, the entire list will be represented
+    as a single string (the result of calling str()) on it.
+    
+    The ordering of the fields in the key and value is determined by the 
+    schema that was used in writing the tuples.
+    
+    Output is a map with keys 'records', 'counters', 'conditions'.
+    """
+    # Initialize storage. 
+    data = {}
+    data['records'] = []
+    data['counters'] = {}
+    data['conditions'] = {}
+    
+    for vals, record_value in iter_output_tuple(output_file, data):
         # Append the value string to the end of key list.
         vals.append(record_value)
         data['records'].append(vals)
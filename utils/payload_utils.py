@@ -4,7 +4,23 @@ A collection of useful functions for working with FxOS Metrics data payloads.
 These will generally be called in the map function of an AWS job.
 """
 
+import os
 import re
+import hashlib
+import struct
+from datetime import datetime
+
+import mapred
+
+# The names of the MR dims, in order, as specified in the filter files.
+dims_keys = [
+    'reason',
+    'appName',
+    'appUpdateChannel',
+    'appVersion',
+    'appBuildID',
+    'submission_date'
+]
 
 
 def get_submission_date(dims):
@@ -32,6 +48,120 @@ def insert_submission_date(value, dims):
     return value
 
 
+# Fraction of payloads to retain when sampling, set for exploratory runs 
+# using the environment variable FXOS_SAMPLE_RATE. 
+# The default of 1 means no sampling.
+sample_rate = float(os.environ.get('FXOS_SAMPLE_RATE', 1))
+
+
+def get_raw_field(value, field):
+    """Extract the value of a field from the raw JSON payload string without 
+    parsing it.
+    
+    Returns the first occurrence of the field as a string (including quotes 
+    for string values), or else None if it was not found.
+    """
+    m = re.search('"%s"\s*:\s*("[^"]*"|[^,}\s]*)' % re.escape(field), value)
+    return m.group(1) if m is not None else None
+
+
+def in_sample(value, field = 'deviceID', rate = None):
+    """Decide whether a raw JSON payload belongs to the sample.
+    
+    The decision is deterministic, based on a stable hash of the value of the
+    given field, so that all payloads sharing that value (eg. all pings from 
+    the same device) are either kept or dropped together. If the field is 
+    missing, the entire payload string is hashed instead. 
+    
+    The payload is kept with probability given by rate, which defaults to the
+    module-level sample_rate.
+    """
+    if rate is None:
+        rate = sample_rate
+    if rate >= 1:
+        return True
+    fieldval = get_raw_field(value, field)
+    if fieldval is None:
+        fieldval = value
+    if isinstance(fieldval, unicode):
+        fieldval = fieldval.encode('utf-8')
+    h = int(hashlib.md5(fieldval).hexdigest()[:8], 16)
+    return h < rate * 0x100000000
+
+
+def sample_payload(context, value, field = 'deviceID', rate = None):
+    """Apply sampling to a raw JSON payload, before any parsing.
+    
+    Returns True if the payload should be processed. When sampling is active, 
+    records are counted in the 'sampling' counter group as 'kept' or 
+    'skipped', so that postprocessing can recover the sampling rate and scale 
+    counts accordingly.
+    """
+    if rate is None:
+        rate = sample_rate
+    if rate >= 1:
+        return True
+    kept = in_sample(value, field, rate)
+    mapred.increment_counter_tuple(context, 'kept' if kept else 'skipped',
+        'sampling')
+    return kept
+
+
+def in_date_window(context, value, dims, earliest_submission = None, 
+                            earliest_ping = None, ping_field = 'pingTime'):
+    """Check whether a raw JSON payload falls within a date window, before 
+    any parsing.
+    
+    The earliest submission and ping dates are ISO-formatted strings, or None
+    for no restriction (see utils.date_window.get_window_dates()). The 
+    submission date is read from the MR dims, and the ping date is taken from
+    the millisecond timestamp in ping_field in the raw payload. Payloads 
+    missing these values are kept, as are payloads whose ping timestamp 
+    cannot be converted to a date, which are recorded as a condition.
+    
+    Payloads outside the window are counted in the 'outsidewindow' counter 
+    group, and False is returned.
+    """
+    if earliest_submission is not None:
+        sdate = get_submission_date(dims)
+        if sdate is not None and sdate < earliest_submission.replace('-', ''):
+            mapred.increment_counter_tuple(context, 'submission', 
+                'outsidewindow')
+            return False
+    if earliest_ping is not None:
+        ping_time = get_raw_field(value, ping_field)
+        if ping_time is not None:
+            try:
+                pdate = datetime.utcfromtimestamp(
+                    int(ping_time.strip('"')) // 1000).date().isoformat()
+            except (ValueError, OverflowError) as e:
+                # Keep the payload, and leave it to the job to deal with 
+                # the bad timestamp.
+                mapred.write_condition_tuple(context, 'bad %s for date '
+                    'window: %s' % (ping_field, type(e).__name__))
+                return True
+            if pdate < earliest_ping:
+                mapred.increment_counter_tuple(context, 'ping', 
+                    'outsidewindow')
+                return False
+    return True
+
+
+def payload_id_string(payload_id):
+    """Convert an AU payload identifier (deviceID, start, stop) to a string
+    key, as used in the filter of previously seen payloads.
+    """
+    return u'|'.join([unicode(v) for v in payload_id])
+
+
+def payload_hash(payload_id):
+    """Compute a stable 64-bit integer hash of an AU payload identifier, for 
+    use as a compact map key.
+    """
+    digest = hashlib.md5(payload_id_string(payload_id).encode('utf-8'))
+    return struct.unpack('<q', digest.digest()[:8])[0]
+
+
 def search_nested_dict(obj, storage, keypath = '', exclude = (), sep = '|', 
                                                             keysonly = False):
     """Recursively follow paths down to the terminal data values of a 
@@ -72,44 +202,125 @@ def search_nested_dict(obj, storage, keypath = '', exclude = (), sep = '|',
             storage[keypath] = obj
 
 
-def get_keypaths(adict, exclude = (), sep = '|'):
-    """ Recursively follow paths down to the terminal data values of a 
+def walk_nested_dict(obj, exclude = (), sep = '|', aspaths = False, 
+                                                            keysonly = False):
+    """Iteratively follow paths down to the terminal data values of a 
     hierarchical structure of nested dicts (leaf nodes in a tree).
     
+    This is a stack-based alternative to search_nested_dict() which avoids 
+    deep recursion and the overhead of a function call per node. Depending on 
+    the value of keysonly, returns either a list of (keypath, value) pairs, 
+    one for each terminal node, or the list of keypaths alone. The ordering 
+    is not the same as for the recursive search.
+    
+    If aspaths is True, keypaths are tuples of key strings. Otherwise, they 
+    are strings constructed by joining the keys using the sep character.
+    
+    Keypaths listed in exclude will not be searched further, and will be 
+    treated as terminal nodes whose value is an empty dict. The exclude arg
+    should be a collection of paths, where each path is represented as a 
+    tuple (or list) of key strings. It is converted to a set for fast lookup.
+    """
+    if aspaths:
+        exclude = set(tuple(path) for path in exclude)
+        root = ()
+    else:
+        exclude = set(sep.join(path) for path in exclude)
+        root = ''
+    if root in exclude:
+        obj = {}
+    if not isinstance(obj, dict) or len(obj) == 0:
+        return [root] if keysonly else [(root, obj)]
+    
+    storage = []
+    store = storage.append
+    # Each stack entry is a non-empty dict together with its keypath.
+    # Terminal values are stored directly rather than being pushed.
+    stack = [(obj, root)]
+    while stack:
+        node, keypath = stack.pop()
+        if aspaths:
+            subpaths = [(keypath + (k,), v) for k, v in node.iteritems()]
+        elif keypath:
+            prefix = keypath + sep
+            subpaths = [(prefix + k, v) for k, v in node.iteritems()]
+        else:
+            subpaths = node.items()
+        for newkeypath, v in subpaths:
+            if exclude and newkeypath in exclude:
+                v = {}
+            if isinstance(v, dict) and len(v) > 0:
+                stack.append((v, newkeypath))
+            elif keysonly:
+                store(newkeypath)
+            else:
+                store((newkeypath, v))
+    return storage
+
+
+def get_structure_signature(adict, exclude = ()):
+    """Compute a cheap signature of the structure of a hierarchy of nested 
+    dicts.
+    
+    The signature is a tuple listing, for each subdict in the order they are 
+    visited, the number of keys followed by the keys themselves, each 
+    followed by the type of its value (or None for non-empty subdicts, which 
+    are then visited in turn). Recording the number of keys marks where each 
+    subdict's entries end, so that the structure can be recovered from the 
+    signature. Payloads with the same signature have the same keypaths and 
+    terminal value types, so it can be used to cache the output of 
+    get_keypaths(). No keypath strings are built.
+    
+    Paths to exclude from the search are specified as in get_keypaths(). 
+    These are treated as terminal nodes of type dict.
+    """
+    exclude = set(tuple(path) for path in exclude)
+    if not isinstance(adict, dict) or () in exclude:
+        return (type(adict),)
+    signature = []
+    stack = [(adict, ())]
+    while stack:
+        node, path = stack.pop()
+        signature.append(len(node))
+        for k, v in node.iteritems():
+            signature.append(k)
+            if isinstance(v, dict):
+                subpath = path + (k,)
+                if len(v) > 0 and subpath not in exclude:
+                    signature.append(None)
+                    stack.append((v, subpath))
+                    continue
+            signature.append(type(v))
+    return tuple(signature)
+
+
+def get_keypaths(adict, exclude = (), sep = '|', aspaths = False):
+    """ Follow paths down to the terminal data values of a hierarchical 
+    structure of nested dicts (leaf nodes in a tree).
+    
     Collect only the keypaths leading down to the terminal nodes, and 
     return them as a list. The keypath strings are constructed by joining the 
-    key strings using the sep character.
+    key strings using the sep character. If aspaths is True, the keypaths are 
+    returned as tuples of key strings instead.
     
     If any paths should be excluded from further search, they can be specified
     using the 'exclude' arg. This should be a tuple of paths, where each path
     is represented as a tuple of key strings.
     """
-    keys = list()
-    if len(exclude) > 0:
-        exclude = [sep.join(path) for path in exclude]
-    search_nested_dict(adict, keys, exclude = exclude, sep = sep,
-                                                            keysonly = True)
-    return keys
+    return walk_nested_dict(adict, exclude, sep, aspaths, keysonly = True)
 
 
-def flatten_nested_dict(adict, exclude = (), sep = '|'):
-    """ Recursively follow paths down to the terminal data values of a 
-    hierarchical structure of nested dicts (leaf nodes in a tree).
+def flatten_nested_dict(adict, exclude = (), sep = '|', aspaths = False):
+    """ Follow paths down to the terminal data values of a hierarchical 
+    structure of nested dicts (leaf nodes in a tree).
     
     Collect keypaths and terminal node values, and return them as a dict. 
     The keypath strings are constructed by joining the key strings using the 
-    sep character.
+    sep character. If aspaths is True, the keypaths are tuples of key strings
+    instead.
     
     If any paths should be excluded from further search, they can be specified
     using the 'exclude' arg. This should be a tuple of paths, where each path
     is represented as a tuple of key strings.
     """
-    flattened = {}
-    if len(exclude) > 0:
-        exclude = [sep.join(path) for path in exclude]
-    search_nested_dict(adict, flattened, exclude = exclude, sep = sep)
-    return flattened
-
-
-
-
+    return dict(walk_nested_dict(adict, exclude, sep, aspaths))